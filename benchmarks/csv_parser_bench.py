@@ -0,0 +1,116 @@
+"""
+Compare CSV parse throughput of the pandas and Arrow backends on ERP-shaped files.
+
+Each file is parsed with pandas (single-threaded) and with the Arrow reader at
+several thread counts; each run is a separate subprocess so one run's thread
+pool settings do not leak into the next.
+
+    python benchmarks/csv_parser_bench.py --rows 1000000 --threads 1 2 4 8
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _gl_lines(rows: int):
+    """General ledger: ids, posting dates, account codes, signed amounts, free text."""
+    start = datetime(2023, 1, 1)
+    yield "doc_no,posting_date,account,cost_center,amount,currency,description"
+    for i in range(rows):
+        yield (
+            f"{100000 + i},{(start + timedelta(minutes=i)):%Y-%m-%d %H:%M:%S},4{i % 900:03d},"
+            f"CC{i % 37:02d},{(i % 10007) * 1.37 - 5000:.2f},{'USD' if i % 5 else 'EUR'},Invoice line {i}"
+        )
+
+
+def _ap_lines(rows: int):
+    """Accounts payable, semicolon-separated European export with day-first dates."""
+    rnd = random.Random(7)
+    yield "vendor_id;invoice_date;due_date;net;tax;paid"
+    for i in range(rows):
+        d = datetime(2023, 1, 1) + timedelta(days=i % 700)
+        yield (
+            f"V{i % 4000:05d};{d:%d.%m.%Y};{(d + timedelta(days=30)):%d.%m.%Y};"
+            f"{rnd.uniform(10, 90000):.2f};{rnd.uniform(0, 9000):.2f};{'Y' if i % 3 else 'N'}"
+        )
+
+
+def _inventory_lines(rows: int):
+    """Inventory snapshot: wide, mostly numeric, some blanks."""
+    cols = [f"qty_{w}" for w in range(12)]
+    yield ",".join(["sku", "plant"] + cols)
+    for i in range(rows):
+        vals = ["" if (i + w) % 17 == 0 else str((i * 7 + w) % 5000) for w in range(12)]
+        yield ",".join([f"SKU{i % 250000:06d}", f"P{i % 12:02d}"] + vals)
+
+
+SHAPES = {"gl": _gl_lines, "ap": _ap_lines, "inventory": _inventory_lines}
+
+
+def make_file(path: str, shape: str, rows: int):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in SHAPES[shape](rows):
+            f.write(line + "\n")
+
+
+def run_mode(mode: str, path: str, threads: int):
+    if mode == "arrow":
+        import pyarrow as pa
+
+        pa.set_cpu_count(threads)
+        pa.set_io_thread_count(threads)
+        from utils.readers import iter_arrow_csv_chunks as reader
+    else:
+        import pandas as pd
+        from utils.readers import sniff_csv
+
+        encoding, delimiter = sniff_csv(path)
+
+        def reader(p):
+            return pd.read_csv(p, sep=delimiter, encoding=encoding, chunksize=50_000)
+
+    start = time.perf_counter()
+    rows = sum(len(chunk) for chunk in reader(path))
+    elapsed = time.perf_counter() - start
+    mb = os.path.getsize(path) / 1024 / 1024
+    label = f"{mode} x{threads}" if mode == "arrow" else mode
+    print(
+        f"{os.path.basename(path):<14} {label:<10} rows={rows:<9} time={elapsed:6.2f}s "
+        f"{mb / elapsed:7.1f} MB/s {mb / elapsed / threads:7.1f} MB/s/core"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 4])
+    parser.add_argument("--mode", choices=["pandas", "arrow"])
+    parser.add_argument("--file")
+    parser.add_argument("--thread-count", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.file, args.thread_count)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for shape in SHAPES:
+            path = os.path.join(tmp, f"{shape}.csv")
+            make_file(path, shape, args.rows)
+            runs = [("pandas", 1)] + [("arrow", n) for n in sorted(set(args.threads))]
+            for mode, n in runs:
+                subprocess.run(
+                    [sys.executable, __file__, "--mode", mode, "--file", path, "--thread-count", str(n)],
+                    check=True,
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compare the streaming openpyxl reader with pd.read_excel on an ERP-shaped .xlsx.
+
+Each mode runs in its own subprocess so peak RSS is measured independently.
+
+    python benchmarks/excel_reader_bench.py --rows 300000
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_workbook(path: str, rows: int):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("GL")
+    ws.append(["doc_no", "posting_date", "account", "cost_center", "amount", "currency", "description"])
+    start = datetime(2023, 1, 1)
+    for i in range(rows):
+        ws.append([
+            100000 + i,
+            start + timedelta(minutes=i),
+            f"4{i % 900:03d}",
+            f"CC{i % 37:02d}",
+            round((i % 10007) * 1.37, 2),
+            "USD" if i % 5 else "EUR",
+            f"Invoice line {i}",
+        ])
+    wb.save(path)
+
+
+def run_mode(mode: str, path: str):
+    start = time.perf_counter()
+    if mode == "read_excel":
+        import pandas as pd
+
+        rows = len(pd.read_excel(path))
+    else:
+        from utils.readers import iter_xlsx_chunks
+
+        rows = sum(len(chunk) for chunk in iter_xlsx_chunks(path))
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode:<12} rows={rows:<8} time={elapsed:7.2f}s peak_rss={peak_mb:8.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--mode", choices=["read_excel", "streaming"])
+    parser.add_argument("--file")
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.file)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "erp.xlsx")
+        print(f"Writing {args.rows} rows to {path} ...")
+        make_workbook(path, args.rows)
+        print(f"File size: {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+        for mode in ("read_excel", "streaming"):
+            subprocess.run([sys.executable, __file__, "--mode", mode, "--file", path], check=True)
+
+
+if __name__ == "__main__":
+    main()
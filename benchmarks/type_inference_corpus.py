@@ -0,0 +1,83 @@
+"""
+Check the type inference engine against ERP-shaped column samples.
+
+Each corpus entry is a column as it arrives from a CSV/Excel export, the
+Postgres type it should get and what the first value converts to.
+
+    python benchmarks/type_inference_corpus.py
+"""
+import os
+import sys
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.type_inference import infer_column_spec, coerce_frame  # noqa: E402
+
+# name: (raw values, expected pg_type, expected first converted value)
+CORPUS = {
+    "doc_no": (pd.Series([100001, 100002, 100003]), "integer", 100001),
+    "line_no": (pd.Series([1, 2, 10]), "smallint", 1),
+    "sap_object_id": (pd.Series([9_000_000_000_001, 9_000_000_000_002]), "bigint", 9_000_000_000_001),
+    "qty_with_blanks": (pd.Series([5.0, np.nan, 12.0]), "smallint", 5),
+    "amount_float": (pd.Series([1250.5, 99.99, -3.1]), "numeric(18,2)", 1250.5),
+    "fx_rate": (pd.Series([1.0842, 0.9231, 1.1]), "numeric(18,4)", 1.0842),
+    "ratio_float": (pd.Series([0.333333333, 0.142857142]), "double precision", 0.333333333),
+    "amount_currency": (pd.Series(["$1,234.50", "(12.00)", "€ 7.25"]), "numeric(18,2)", 1234.5),
+    "amount_trailing_minus": (pd.Series(["150.00-", "20.00", "3.10"]), "numeric(18,2)", -150.0),
+    "qty_text": (pd.Series(["12", "1,500", " 7 "]), "smallint", 12),
+    "account_code": (pd.Series(["0100", "0200", "4000"]), "text", "0100"),
+    "cost_center": (pd.Series(["CC01", "CC02", "CC37"]), "text", "CC01"),
+    "currency": (pd.Series(["USD", "EUR", "USD"]), "text", "USD"),
+    "posted_flag": (pd.Series(["Y", "N", "y"]), "boolean", True),
+    "cleared_flag": (pd.Series(["Yes", "No", None]), "boolean", True),
+    "is_reversal": (pd.Series([True, False]), "boolean", True),
+    "posting_date_iso": (pd.Series(["2024-01-31", "2024-02-01", ""]), "date", date(2024, 1, 31)),
+    "posting_date_us": (pd.Series(["01/31/2024", "02/01/2024"]), "date", date(2024, 1, 31)),
+    "posting_date_eu": (pd.Series(["31.01.2024", "01.02.2024"]), "date", date(2024, 1, 31)),
+    "posting_date_dmy": (pd.Series(["31/01/2024", "13/02/2024"]), "date", date(2024, 1, 31)),
+    "posting_date_mon": (pd.Series(["31-Jan-2024", "01-Feb-2024"]), "date", date(2024, 1, 31)),
+    "created_at": (
+        pd.Series(["2024-01-31 08:15:00", "2024-02-01 17:45:30"]),
+        "timestamptz",
+        datetime(2024, 1, 31, 8, 15),
+    ),
+    "excel_dates": (pd.Series(pd.to_datetime(["2024-01-31", "2024-02-01"])), "date", date(2024, 1, 31)),
+    "excel_datetimes": (
+        pd.Series(pd.to_datetime(["2024-01-31 08:15", "2024-02-01 00:00"])),
+        "timestamptz",
+        datetime(2024, 1, 31, 8, 15),
+    ),
+    "description": (pd.Series(["Invoice line 1", "Credit memo", "12 units"]), "text", "Invoice line 1"),
+    "empty_column": (pd.Series([None, None], dtype=object), "text", None),
+}
+
+
+def _first_value(v):
+    if v is None or v is pd.NA or (isinstance(v, float) and np.isnan(v)):
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.date() if v == v.normalize() else v.to_pydatetime()
+    return v.item() if hasattr(v, "item") else v
+
+
+def main() -> int:
+    failures = 0
+    for name, (raw, expected_type, expected_value) in CORPUS.items():
+        spec = infer_column_spec(raw)
+        converted = coerce_frame(pd.DataFrame({name: raw}), {name: spec})[name]
+        value = _first_value(converted.iloc[0])
+        ok = spec.pg_type == expected_type and value == expected_value
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name:<22} {spec.pg_type:<17} {value!r}")
+        if not ok:
+            print(f"     expected {expected_type} {expected_value!r}")
+    print(f"\n{len(CORPUS) - failures}/{len(CORPUS)} columns inferred as expected")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
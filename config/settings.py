@@ -1,5 +1,6 @@
 import os
 import re
+import tempfile
 import streamlit as st
 # ---------- Configuration (use environment variables) ----------
 DB_HOST = st.secrets["db_host"] #os.getenv("DB_HOST", "localhost")
@@ -11,8 +12,50 @@ DB_ADMIN_PWD = st.secrets["db_password"]  # os.getenv("DB_ADMIN_PWD", "moni123")
 DB_APP_USER = st.secrets["db_user"] #os.getenv("DB_APP_USER", DB_ADMIN_USER)
 DB_APP_PWD = st.secrets["db_password"] #os.getenv("DB_APP_PWD", DB_ADMIN_PWD)
 
+# Connection pools: one bounded pool per (role, database), least recently used idle pools evicted
+DB_POOL_MAX_CONN = 5 #int(os.getenv("DB_POOL_MAX_CONN", 5))
+DB_POOL_MAX_DATABASES = 50 #int(os.getenv("DB_POOL_MAX_DATABASES", 50))
+DB_POOL_TIMEOUT_SECS = 30 #float(os.getenv("DB_POOL_TIMEOUT_SECS", 30))
+DB_POOL_PING_AFTER_SECS = 30 #float(os.getenv("DB_POOL_PING_AFTER_SECS", 30))
+
 # Limits
 MAX_UPLOAD_BYTES = 200 * 1024 * 1024 #int(os.getenv("MAX_UPLOAD_BYTES", 200 * 1024 * 1024))
+# Compressed uploads: MAX_UPLOAD_BYTES applies to the archive, this to what it expands to
+MAX_DECOMPRESSED_BYTES = 2 * 1024 * 1024 * 1024 #int(os.getenv("MAX_DECOMPRESSED_BYTES", 2 * 1024 * 1024 * 1024))
+CSV_CHUNK_ROWS = 50_000 #int(os.getenv("CSV_CHUNK_ROWS", 50_000))
+# CSV parser backend: "pandas" (single-threaded C parser) or "arrow" (multithreaded pyarrow reader)
+CSV_PARSER = "pandas" #os.getenv("CSV_PARSER", "pandas")
+ARROW_CSV_BLOCK_BYTES = 4 * 1024 * 1024 #int(os.getenv("ARROW_CSV_BLOCK_BYTES", 4 * 1024 * 1024))
+
+# Parsed uploads cached as Parquet by file SHA-256, least recently used evicted past the size cap (0 disables)
+PARSE_CACHE_DIR = os.path.join(tempfile.gettempdir(), "finlyst_parse_cache") #os.getenv("PARSE_CACHE_DIR", ...)
+PARSE_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024 #int(os.getenv("PARSE_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+COPY_SERIALIZE_ROWS = 5_000 #int(os.getenv("COPY_SERIALIZE_ROWS", 5_000))
+
+# Multi-file uploads: files are parsed in a process pool, loads into different ERPs run concurrently
+UPLOAD_PARSE_PROCESSES = 4 #int(os.getenv("UPLOAD_PARSE_PROCESSES", 4))
+UPLOAD_MAX_CONCURRENT_COPIES = 4 #int(os.getenv("UPLOAD_MAX_CONCURRENT_COPIES", 4))
+
+# Background upload jobs: queue table lives in UPLOAD_JOBS_DB, files wait in UPLOAD_JOB_DIR
+UPLOAD_JOBS_DB = "postgres" #os.getenv("UPLOAD_JOBS_DB", "postgres")
+UPLOAD_JOB_DIR = os.path.join(tempfile.gettempdir(), "finlyst_upload_jobs") #os.getenv("UPLOAD_JOB_DIR", ...)
+UPLOAD_JOB_WORKERS = 2 #int(os.getenv("UPLOAD_JOB_WORKERS", 2))
+UPLOAD_JOB_POLL_SECS = 1.0 #float(os.getenv("UPLOAD_JOB_POLL_SECS", 1.0))
+UPLOAD_JOB_STALE_SECS = 900 #int(os.getenv("UPLOAD_JOB_STALE_SECS", 900))
+# Running jobs bump updated_at this often, so only jobs whose worker died go stale
+UPLOAD_JOB_HEARTBEAT_SECS = 60 #int(os.getenv("UPLOAD_JOB_HEARTBEAT_SECS", 60))
+# A job that went stale this many times (its worker kept dying) is failed instead of reclaimed
+UPLOAD_JOB_MAX_ATTEMPTS = 3 #int(os.getenv("UPLOAD_JOB_MAX_ATTEMPTS", 3))
+
+# Question answering: chat model (via OpenRouter); warm agents are kept for this many databases
+AGENT_MODEL = "openai/gpt-4.1-mini" #os.getenv("AGENT_MODEL", "openai/gpt-4.1-mini")
+AGENT_API_BASE = "https://openrouter.ai/api/v1" #os.getenv("AGENT_API_BASE", "https://openrouter.ai/api/v1")
+AGENT_CACHE_MAX_DATABASES = 20 #int(os.getenv("AGENT_CACHE_MAX_DATABASES", 20))
+# Validated SQL of answered questions, keyed by schema fingerprint, is kept in this database
+QUESTION_CACHE_DB = "postgres" #os.getenv("QUESTION_CACHE_DB", "postgres")
+# Query results cached as Parquet per (database, SQL, upload versions of its tables); LRU past the cap (0 disables)
+RESULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "finlyst_result_cache") #os.getenv("RESULT_CACHE_DIR", ...)
+RESULT_CACHE_MAX_BYTES = 512 * 1024 * 1024 #int(os.getenv("RESULT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
 ALLOWED_NAME_RE = re.compile(r"^[a-z0-9_]+$")
 
 
@@ -1,3 +1,5 @@
+from psycopg2.extras import Json
+
 def last_upload_for_table(conn, table_name: str):
     """Return last audit row for the table_name or None."""
     cur = conn.cursor()
@@ -12,3 +14,116 @@ def last_upload_for_table(conn, table_name: str):
         return {"id": row[0], "file_hash": row[1], "uploaded_at": row[2], "rows": row[3], "status": row[4]}
     finally:
         cur.close()
+
+
+def last_sheet_upload(conn, table_name: str):
+    """Return the erp_name and sheet_name of the last successful upload into table_name, or None."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT erp_name, sheet_name FROM upload_audit "
+            "WHERE table_name = %s AND action = 'upload' AND status = 'success' ORDER BY uploaded_at DESC LIMIT 1",
+            [table_name],
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        return {"erp_name": row[0], "sheet_name": row[1]}
+    finally:
+        cur.close()
+
+
+def last_upload_for_erp(conn, erp_name: str):
+    """Return the last successful upload audit row for any table version of erp_name, or None."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT id, file_hash, uploaded_at, rows, status, table_name FROM upload_audit "
+            "WHERE erp_name = %s AND action = 'upload' AND status = 'success' ORDER BY uploaded_at DESC LIMIT 1",
+            [erp_name],
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        return {"id": row[0], "file_hash": row[1], "uploaded_at": row[2], "rows": row[3], "status": row[4], "table_name": row[5]}
+    finally:
+        cur.close()
+
+
+_CHECKPOINT_COUNTS = ("rows_read", "rows_copied", "rows_new", "rows_existing", "rows_rejected")
+
+def load_checkpoint(conn, erp_name: str, file_hash: str):
+    """Return the upload_checkpoints row for a partly loaded file, or None.
+
+    The dict has table_name, the cumulative counts in _CHECKPOINT_COUNTS and
+    reject_counts.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"SELECT table_name, {', '.join(_CHECKPOINT_COUNTS)}, reject_counts FROM upload_checkpoints "
+            "WHERE erp_name = %s AND file_hash = %s",
+            [erp_name, file_hash],
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        return {
+            "table_name": row[0],
+            **dict(zip(_CHECKPOINT_COUNTS, row[1:-1])),
+            "reject_counts": row[-1] or {},
+        }
+    finally:
+        cur.close()
+
+def save_checkpoint(cur, erp_name: str, file_hash: str, table_name: str, totals: dict):
+    """Upsert the cumulative progress of a file; call in the same transaction as the chunk's merge."""
+    cur.execute(
+        f"""
+        INSERT INTO upload_checkpoints (erp_name, file_hash, table_name, {', '.join(_CHECKPOINT_COUNTS)}, reject_counts)
+        VALUES (%s, %s, %s, {', '.join(['%s'] * len(_CHECKPOINT_COUNTS))}, %s)
+        ON CONFLICT (erp_name, file_hash) DO UPDATE SET
+            table_name = EXCLUDED.table_name,
+            {', '.join(f'{c} = EXCLUDED.{c}' for c in _CHECKPOINT_COUNTS)},
+            reject_counts = EXCLUDED.reject_counts,
+            updated_at = now()
+        """,
+        [erp_name, file_hash, table_name, *(totals[c] for c in _CHECKPOINT_COUNTS), Json(totals["reject_counts"])],
+    )
+
+def clear_checkpoint(cur, erp_name: str, file_hash: str):
+    cur.execute("DELETE FROM upload_checkpoints WHERE erp_name = %s AND file_hash = %s", [erp_name, file_hash])
+
+def table_versions(conn, tables) -> dict:
+    """Return {table: version} for the given tables, or None when some table has no upload history.
+
+    A version is the table's latest upload_audit id plus the last checkpoint
+    write of an upload still in progress, so it changes with every committed
+    chunk, finished upload and delete. Tables that were not loaded by the
+    uploader (or databases without upload_audit) have no version.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT to_regclass('public.upload_audit') IS NOT NULL "
+            "AND to_regclass('public.upload_checkpoints') IS NOT NULL"
+        )
+        if not cur.fetchone()[0]:
+            return None
+        cur.execute(
+            """
+            SELECT t.name,
+                   (SELECT max(a.id) FROM upload_audit a WHERE a.table_name = t.name),
+                   (SELECT max(c.updated_at) FROM upload_checkpoints c WHERE c.table_name = t.name)
+            FROM unnest(%s::text[]) AS t(name)
+            """,
+            [sorted(tables)],
+        )
+        versions = {}
+        for table, audit_id, checkpoint_at in cur.fetchall():
+            if audit_id is None:
+                return None
+            versions[table] = f"{audit_id}/{checkpoint_at.isoformat() if checkpoint_at else ''}"
+        return versions
+    finally:
+        cur.close()
@@ -1,5 +1,13 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 import psycopg2
-from config.settings import DB_ADMIN_USER, DB_ADMIN_PWD, DB_APP_USER, DB_APP_PWD, DB_HOST, DB_PORT
+from psycopg2 import extensions, pool
+from config.settings import (
+    DB_ADMIN_USER, DB_ADMIN_PWD, DB_APP_USER, DB_APP_PWD, DB_HOST, DB_PORT,
+    DB_POOL_MAX_CONN, DB_POOL_MAX_DATABASES, DB_POOL_TIMEOUT_SECS, DB_POOL_PING_AFTER_SECS,
+)
 
 def admin_connect(dbname="postgres"):
     return psycopg2.connect(
@@ -19,3 +27,200 @@ def app_connect(dbname):
         host=DB_HOST,
         port=DB_PORT,
     )
+
+
+class _DatabasePool:
+    """Bounded pool of connections to one database for one role.
+
+    Checkout blocks (up to DB_POOL_TIMEOUT_SECS) once max_conn connections are
+    in use. Idle connections are health-checked before being handed out.
+    """
+
+    def __init__(self, connect, dbname: str, max_conn: int):
+        self._connect = connect
+        self._dbname = dbname
+        self._slots = threading.BoundedSemaphore(max_conn)
+        self._lock = threading.Lock()
+        self._idle = []  # [(conn, returned_at)]
+        self.max_conn = max_conn
+        self.in_use = 0
+        # Set once the manager drops the pool; checkouts then retry on a fresh pool
+        self.closed = False
+        self.stats = {"created": 0, "reused": 0, "discarded": 0, "waits": 0}
+
+    def _healthy(self, conn, returned_at: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < DB_POOL_PING_AFTER_SECS:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                conn, returned_at = self._idle.pop()
+            if self._healthy(conn, returned_at):
+                return conn
+            self._discard(conn)
+
+    def checkout(self):
+        """Return a connection, or None if the pool was closed meanwhile."""
+        if self.closed:
+            return None
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats["waits"] += 1
+            if not self._slots.acquire(timeout=DB_POOL_TIMEOUT_SECS):
+                raise pool.PoolError(
+                    f"Timed out waiting for a connection to '{self._dbname}' ({self.max_conn} in use)."
+                )
+        try:
+            conn = self._take_idle()
+            created = conn is None
+            if created:
+                conn = self._connect(self._dbname)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            if not self.closed:
+                self.in_use += 1
+                self.stats["created" if created else "reused"] += 1
+                return conn
+        self._discard(conn)
+        self._slots.release()
+        return None
+
+    def checkin(self, conn):
+        try:
+            if not conn.closed:
+                status = conn.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    conn.close()
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if not conn.closed and conn.autocommit:
+                    conn.autocommit = False
+        except psycopg2.Error:
+            conn.close()
+        with self._lock:
+            self.in_use -= 1
+            if conn.closed:
+                self.stats["discarded"] += 1
+            elif not self.closed:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+        if conn is not None and not conn.closed:
+            # Returned to a pool that was closed while the connection was out
+            self._discard(conn)
+        self._slots.release()
+
+    def _discard(self, conn):
+        with self._lock:
+            self.stats["discarded"] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def close(self):
+        """Close idle connections and make connections still out close on checkin."""
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+class ConnectionManager:
+    """One bounded pool per (role, database), evicting least recently used idle pools.
+
+    Tenants each live in their own user_* database, so pools are created lazily
+    and only max_databases of them are kept warm.
+    """
+
+    def __init__(self, max_conn: int = DB_POOL_MAX_CONN, max_databases: int = DB_POOL_MAX_DATABASES):
+        self.max_conn = max_conn
+        self.max_databases = max_databases
+        self._pools = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pool(self, role: str, dbname: str) -> _DatabasePool:
+        key = (role, dbname)
+        evicted = []
+        with self._lock:
+            p = self._pools.get(key)
+            if p is None or p.closed:
+                connect = admin_connect if role == "admin" else app_connect
+                p = self._pools[key] = _DatabasePool(connect, dbname, self.max_conn)
+            self._pools.move_to_end(key)
+            for k in list(self._pools):
+                if len(self._pools) <= self.max_databases:
+                    break
+                if k != key and self._pools[k].in_use == 0:
+                    evicted.append(self._pools.pop(k))
+        for old in evicted:
+            old.close()
+        return p
+
+    @contextmanager
+    def connection(self, dbname: str, role: str = "app"):
+        """Borrow a connection; it is rolled back if needed and returned on exit."""
+        while True:
+            p = self._pool(role, dbname)
+            conn = p.checkout()
+            if conn is not None:
+                break
+            # Another thread evicted or closed the pool after we looked it up
+        try:
+            yield conn
+        finally:
+            p.checkin(conn)
+
+    def close_database(self, dbname: str):
+        """Close idle connections to dbname for every role (ones in use on return), e.g. before dropping it."""
+        with self._lock:
+            pools = [self._pools.pop(k) for k in list(self._pools) if k[1] == dbname]
+        for p in pools:
+            p.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            items = list(self._pools.items())
+        return {
+            f"{role}:{dbname}": {
+                "in_use": p.in_use,
+                "idle": len(p._idle),
+                "max_conn": p.max_conn,
+                **p.stats,
+            }
+            for (role, dbname), p in items
+        }
+
+
+connection_manager = ConnectionManager()
+
+def app_connection(dbname: str):
+    """Pooled connection to a tenant database using app credentials."""
+    return connection_manager.connection(dbname, "app")
+
+def admin_connection(dbname: str = "postgres"):
+    """Pooled connection using admin credentials."""
+    return connection_manager.connection(dbname, "admin")
+
+def pool_stats() -> dict:
+    return connection_manager.stats()
+
+def session_timezone(conn) -> str:
+    """The server TimeZone setting that text timestamps are interpreted in."""
+    with conn.cursor() as cur:
+        cur.execute("SHOW TimeZone")
+        return cur.fetchone()[0]
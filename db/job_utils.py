@@ -0,0 +1,193 @@
+import threading
+from db.connections import admin_connection
+from config.settings import UPLOAD_JOBS_DB, UPLOAD_JOB_STALE_SECS, UPLOAD_JOB_MAX_ATTEMPTS
+
+_JOB_COLUMNS = (
+    "id", "user_id", "erp_name", "file_name", "file_path", "file_hash", "status", "phase",
+    "rows_copied", "error", "traceback", "attempts", "created_at", "started_at", "updated_at", "finished_at",
+    "workbook",
+)
+
+def _job_dict(row) -> dict:
+    return dict(zip(_JOB_COLUMNS, row)) if row else None
+
+def ensure_jobs_table():
+    """Create upload_jobs in the jobs database if not exists."""
+    with admin_connection(UPLOAD_JOBS_DB) as conn:
+        cur = conn.cursor()
+        try:
+            # IF NOT EXISTS is not atomic against a concurrent CREATE; serialize it
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('upload_jobs'))")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS upload_jobs (
+                    id bigserial PRIMARY KEY,
+                    user_id text NOT NULL,
+                    erp_name text NOT NULL,
+                    file_name text,
+                    file_path text NOT NULL,
+                    file_hash text,
+                    status text NOT NULL DEFAULT 'queued',
+                    phase text,
+                    rows_copied bigint NOT NULL DEFAULT 0,
+                    error text,
+                    traceback text,
+                    attempts integer NOT NULL DEFAULT 0,
+                    created_at timestamptz DEFAULT now(),
+                    started_at timestamptz,
+                    updated_at timestamptz DEFAULT now(),
+                    finished_at timestamptz,
+                    workbook boolean NOT NULL DEFAULT false
+                );
+            """)
+            # Queues created before workbook uploads existed
+            cur.execute("ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS workbook boolean NOT NULL DEFAULT false")
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS upload_jobs_pending_idx
+                    ON upload_jobs (id) WHERE status IN ('queued', 'running');
+            """)
+            conn.commit()
+        finally:
+            cur.close()
+
+
+_jobs_table_ready = False
+_jobs_table_lock = threading.Lock()
+
+def jobs_table():
+    """Run ensure_jobs_table once per process."""
+    global _jobs_table_ready
+    if _jobs_table_ready:
+        return
+    with _jobs_table_lock:
+        if not _jobs_table_ready:
+            ensure_jobs_table()
+            _jobs_table_ready = True
+
+def insert_job(user_id: str, erp_name: str, file_name: str, file_path: str, file_hash: str,
+               workbook: bool = False) -> int:
+    jobs_table()
+    with admin_connection(UPLOAD_JOBS_DB) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                INSERT INTO upload_jobs (user_id, erp_name, file_name, file_path, file_hash, workbook, phase)
+                VALUES (%s, %s, %s, %s, %s, %s, 'queued') RETURNING id
+                """,
+                (user_id, erp_name, file_name, file_path, file_hash, workbook),
+            )
+            job_id = cur.fetchone()[0]
+            conn.commit()
+            return job_id
+        finally:
+            cur.close()
+
+def claim_job():
+    """Mark the oldest runnable job as running and return it, or None.
+
+    FOR UPDATE SKIP LOCKED lets any number of worker threads/processes poll at
+    once without blocking each other. A job waits while an older job for the
+    same ERP is still queued or running, so one ERP's files load in upload
+    order. Jobs whose worker stopped updating them (progress writes and
+    run_job's heartbeat) for UPLOAD_JOB_STALE_SECS are picked up again, up to
+    UPLOAD_JOB_MAX_ATTEMPTS runs in total (see fail_exhausted_jobs).
+    """
+    jobs_table()
+    with admin_connection(UPLOAD_JOBS_DB) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                f"""
+                UPDATE upload_jobs
+                SET status = 'running', phase = 'starting', rows_copied = 0, error = NULL,
+                    traceback = NULL, attempts = attempts + 1, started_at = now(), updated_at = now()
+                WHERE id = (
+                    SELECT j.id FROM upload_jobs j
+                    WHERE (j.status = 'queued'
+                           OR (j.status = 'running' AND j.updated_at < now() - make_interval(secs => %s)
+                               AND j.attempts < %s))
+                      AND NOT EXISTS (
+                          SELECT 1 FROM upload_jobs e
+                          WHERE e.user_id = j.user_id AND e.erp_name = j.erp_name AND e.id < j.id
+                            AND e.status IN ('queued', 'running')
+                      )
+                    ORDER BY j.id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING {", ".join(_JOB_COLUMNS)}
+                """,
+                (UPLOAD_JOB_STALE_SECS, UPLOAD_JOB_MAX_ATTEMPTS),
+            )
+            job = _job_dict(cur.fetchone())
+            conn.commit()
+            return job
+        finally:
+            cur.close()
+
+def fail_exhausted_jobs() -> list:
+    """Fail stale running jobs that already had UPLOAD_JOB_MAX_ATTEMPTS runs; returns their file paths.
+
+    Without this a job whose file kills its worker every time would stay
+    'running' and hold back every later job for its ERP.
+    """
+    jobs_table()
+    with admin_connection(UPLOAD_JOBS_DB) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                UPDATE upload_jobs
+                SET status = 'error', phase = 'failed', error = %s, updated_at = now(), finished_at = now()
+                WHERE status = 'running' AND updated_at < now() - make_interval(secs => %s) AND attempts >= %s
+                RETURNING file_path
+                """,
+                (
+                    f"Gave up after {UPLOAD_JOB_MAX_ATTEMPTS} attempts; the worker stopped responding each time.",
+                    UPLOAD_JOB_STALE_SECS,
+                    UPLOAD_JOB_MAX_ATTEMPTS,
+                ),
+            )
+            paths = [r[0] for r in cur.fetchall()]
+            conn.commit()
+            return paths
+        finally:
+            cur.close()
+
+def update_job(job_id: int, **fields):
+    """Set the given upload_jobs columns (phase, rows_copied, status, error, ...) and bump updated_at."""
+    fields = {k: v for k, v in fields.items() if k in _JOB_COLUMNS}
+    assignments = [f"{k} = %s" for k in fields] + ["updated_at = now()"]
+    if fields.get("status") in ("success", "error"):
+        assignments.append("finished_at = now()")
+    with admin_connection(UPLOAD_JOBS_DB) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                f"UPDATE upload_jobs SET {', '.join(assignments)} WHERE id = %s",
+                list(fields.values()) + [job_id],
+            )
+            conn.commit()
+        finally:
+            cur.close()
+
+def touch_job(job_id: int):
+    """Bump a running job's updated_at so claim_job does not treat it as stale."""
+    with admin_connection(UPLOAD_JOBS_DB) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("UPDATE upload_jobs SET updated_at = now() WHERE id = %s AND status = 'running'", [job_id])
+            conn.commit()
+        finally:
+            cur.close()
+
+def get_job(job_id: int):
+    """Return the upload_jobs row as a dict, or None."""
+    jobs_table()
+    with admin_connection(UPLOAD_JOBS_DB) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM upload_jobs WHERE id = %s", [job_id])
+            return _job_dict(cur.fetchone())
+        finally:
+            cur.close()
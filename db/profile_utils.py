@@ -0,0 +1,41 @@
+from psycopg2 import sql
+from psycopg2.extras import Json
+
+def load_profiles(conn, tables=None) -> dict:
+    """Return {table: {"row_count": n, "columns": {...}}} from table_profiles ({} if the catalog is absent)."""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT to_regclass('public.table_profiles') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return {}
+        if tables is None:
+            cur.execute("SELECT table_name, row_count, columns FROM table_profiles")
+        else:
+            cur.execute(
+                "SELECT table_name, row_count, columns FROM table_profiles WHERE table_name = ANY(%s)",
+                [list(tables)],
+            )
+        return {t: {"row_count": n, "columns": cols} for t, n, cols in cur.fetchall()}
+    finally:
+        cur.close()
+
+def count_rows(cur, table_name: str) -> int:
+    cur.execute(sql.SQL("SELECT count(*) FROM {}").format(sql.Identifier(table_name)))
+    return cur.fetchone()[0]
+
+def save_profile(cur, table_name: str, row_count: int, columns: dict):
+    """Upsert a table's profile; call in the same transaction as the rows it describes."""
+    cur.execute(
+        """
+        INSERT INTO table_profiles (table_name, row_count, columns)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (table_name) DO UPDATE SET
+            row_count = EXCLUDED.row_count,
+            columns = EXCLUDED.columns,
+            updated_at = now()
+        """,
+        [table_name, row_count, Json(columns)],
+    )
+
+def delete_profiles(cur, tables):
+    cur.execute("DELETE FROM table_profiles WHERE table_name = ANY(%s)", [list(tables)])
@@ -0,0 +1,102 @@
+import threading
+from db.connections import admin_connection
+from config.settings import QUESTION_CACHE_DB
+
+def ensure_question_cache_table():
+    """Create question_sql_cache in the cache database if not exists.
+
+    It lives outside the tenant databases so it never shows up in (or changes)
+    their schemas.
+    """
+    with admin_connection(QUESTION_CACHE_DB) as conn:
+        cur = conn.cursor()
+        try:
+            # IF NOT EXISTS is not atomic against a concurrent CREATE; serialize it
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('question_sql_cache'))")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS question_sql_cache (
+                    dbname text NOT NULL,
+                    schema_fp text NOT NULL,
+                    question text NOT NULL,
+                    sql text NOT NULL,
+                    hits bigint NOT NULL DEFAULT 0,
+                    created_at timestamptz DEFAULT now(),
+                    last_used_at timestamptz DEFAULT now(),
+                    PRIMARY KEY (dbname, question, schema_fp)
+                );
+            """)
+            conn.commit()
+        finally:
+            cur.close()
+
+
+_cache_table_ready = False
+_cache_table_lock = threading.Lock()
+
+def question_cache_table():
+    """Run ensure_question_cache_table once per process."""
+    global _cache_table_ready
+    if _cache_table_ready:
+        return
+    with _cache_table_lock:
+        if not _cache_table_ready:
+            ensure_question_cache_table()
+            _cache_table_ready = True
+
+def lookup_sql(dbname: str, schema_fp: str, question: str):
+    """Return the SQL cached for a normalized question under this schema fingerprint, or None."""
+    question_cache_table()
+    with admin_connection(QUESTION_CACHE_DB) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                """
+                UPDATE question_sql_cache SET hits = hits + 1, last_used_at = now()
+                WHERE dbname = %s AND question = %s AND schema_fp = %s
+                RETURNING sql
+                """,
+                (dbname, question, schema_fp),
+            )
+            row = cur.fetchone()
+            conn.commit()
+            return row[0] if row else None
+        finally:
+            cur.close()
+
+def store_sql(dbname: str, schema_fp: str, question: str, sql_text: str):
+    """Cache sql_text for a question, dropping dbname's entries for any older schema."""
+    question_cache_table()
+    with admin_connection(QUESTION_CACHE_DB) as conn:
+        cur = conn.cursor()
+        try:
+            # Entries for another fingerprint were written before an upload or delete changed the schema
+            cur.execute(
+                "DELETE FROM question_sql_cache WHERE dbname = %s AND schema_fp <> %s",
+                (dbname, schema_fp),
+            )
+            cur.execute(
+                """
+                INSERT INTO question_sql_cache (dbname, schema_fp, question, sql)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (dbname, question, schema_fp)
+                DO UPDATE SET sql = EXCLUDED.sql, last_used_at = now()
+                """,
+                (dbname, schema_fp, question, sql_text),
+            )
+            conn.commit()
+        finally:
+            cur.close()
+
+def forget_sql(dbname: str, schema_fp: str, question: str):
+    """Drop one cached entry, e.g. after its SQL failed to run."""
+    question_cache_table()
+    with admin_connection(QUESTION_CACHE_DB) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(
+                "DELETE FROM question_sql_cache WHERE dbname = %s AND question = %s AND schema_fp = %s",
+                (dbname, question, schema_fp),
+            )
+            conn.commit()
+        finally:
+            cur.close()
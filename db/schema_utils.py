@@ -1,46 +1,116 @@
-from psycopg2 import sql
-from db.connections import admin_connect, app_connect
+import threading
+from psycopg2 import sql, errors
+from db.connections import admin_connection, app_connection
 from utils.file_utils import sanitize_name
 
 def create_user_database(user_id: str) -> str:
     """Create a new database for the sanitized user_id. Safe quoting used."""
     user_id_s = sanitize_name(user_id)
     db_name = f"user_{user_id_s}"
-    conn = admin_connect("postgres")
-    conn.autocommit = True
-    cur = conn.cursor()
-    try:
-        cur.execute(sql.SQL("SELECT 1 FROM pg_database WHERE datname = %s"), [db_name])
-        if cur.fetchone():
-            print(f"Database '{db_name}' already exists.")
-        else:
-            cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(db_name)))
-            print(f"Database '{db_name}' created successfully.")
-    finally:
-        cur.close()
-        conn.close()
+    with admin_connection("postgres") as conn:
+        conn.autocommit = True
+        cur = conn.cursor()
+        try:
+            cur.execute(sql.SQL("SELECT 1 FROM pg_database WHERE datname = %s"), [db_name])
+            if cur.fetchone():
+                print(f"Database '{db_name}' already exists.")
+            else:
+                try:
+                    cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(db_name)))
+                    print(f"Database '{db_name}' created successfully.")
+                except (errors.DuplicateDatabase, errors.UniqueViolation):
+                    # Another worker created it between our check and CREATE
+                    print(f"Database '{db_name}' already exists.")
+        finally:
+            cur.close()
     return db_name
 
 def ensure_audit_table(dbname: str):
-    """Create upload_audit table if not exists in user's DB."""
-    conn = app_connect(dbname)
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS upload_audit (
-                id serial PRIMARY KEY,
-                user_id text,
-                erp_name text,
-                table_name text,
-                file_hash text,
-                rows integer,
-                action text,
-                status text,
-                error text,
-                uploaded_at timestamptz default now()
-            );
-        """)
-        conn.commit()
-    finally:
-        cur.close()
-        conn.close()
+    """Create upload_audit, upload_checkpoints and table_profiles tables if not exists in user's DB."""
+    with app_connection(dbname) as conn:
+        cur = conn.cursor()
+        try:
+            # IF NOT EXISTS is not atomic against a concurrent CREATE; serialize it
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('upload_audit'))")
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS upload_audit (
+                    id serial PRIMARY KEY,
+                    user_id text,
+                    erp_name text,
+                    table_name text,
+                    file_hash text,
+                    rows integer,
+                    action text,
+                    status text,
+                    error text,
+                    uploaded_at timestamptz default now(),
+                    rows_new integer,
+                    rows_existing integer,
+                    rows_rejected integer,
+                    reject_counts jsonb,
+                    sheet_name text
+                );
+            """)
+            # Tenants provisioned before row fingerprints, quarantine or workbook uploads existed
+            cur.execute("""
+                ALTER TABLE upload_audit
+                    ADD COLUMN IF NOT EXISTS rows_new integer,
+                    ADD COLUMN IF NOT EXISTS rows_existing integer,
+                    ADD COLUMN IF NOT EXISTS rows_rejected integer,
+                    ADD COLUMN IF NOT EXISTS reject_counts jsonb,
+                    ADD COLUMN IF NOT EXISTS sheet_name text;
+            """)
+            # Progress of uploads that failed partway, so a retry resumes after the last committed chunk
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS upload_checkpoints (
+                    erp_name text,
+                    file_hash text,
+                    table_name text,
+                    rows_read bigint,
+                    rows_copied bigint,
+                    rows_new bigint,
+                    rows_existing bigint,
+                    rows_rejected bigint,
+                    reject_counts jsonb,
+                    updated_at timestamptz default now(),
+                    PRIMARY KEY (erp_name, file_hash)
+                );
+            """)
+            # Column profiles of uploaded tables, maintained by the uploader for the agent's schema context
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS table_profiles (
+                    table_name text PRIMARY KEY,
+                    row_count bigint,
+                    columns jsonb,
+                    updated_at timestamptz default now()
+                );
+            """)
+            conn.commit()
+        finally:
+            cur.close()
+
+
+# Tenant databases already created and migrated by this process
+_provisioned = set()
+_provision_lock = threading.Lock()
+
+def ensure_tenant(user_id: str) -> str:
+    """Provision the user's database and audit table once per process; returns the DB name.
+
+    After the first call for a tenant this is a set lookup, so the upload and
+    delete paths skip the pg_database check and the audit DDL.
+    """
+    db_name = f"user_{sanitize_name(user_id)}"
+    if db_name in _provisioned:
+        return db_name
+    with _provision_lock:
+        if db_name not in _provisioned:
+            create_user_database(user_id)
+            ensure_audit_table(db_name)
+            _provisioned.add(db_name)
+    return db_name
+
+def forget_tenant(dbname: str):
+    """Drop dbname from the registry so the next ensure_tenant re-provisions it."""
+    with _provision_lock:
+        _provisioned.discard(dbname)
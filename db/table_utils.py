@@ -1,4 +1,20 @@
-from psycopg2 import sql
+import threading
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import sql, extensions
+
+# Hash of the normalized row values; its unique index makes re-sent rows no-ops
+ROW_FP_COLUMN = "_row_fp"
+# 1-based position of a staged row in its COPY input, numbered by the staging table
+STAGE_ROW_COLUMN = "_stage_row"
+# Upload bookkeeping kept in each tenant database next to the ERP tables
+INTERNAL_TABLES = ("upload_checkpoints", "table_profiles")
+_QUARANTINE_PREFIX = "_quarantine_"
+_STAGING_PREFIX = "_stage_"
+
+def internal_table(table_name: str) -> bool:
+    """True for bookkeeping, quarantine and staging tables, which are not ERP data."""
+    return table_name in INTERNAL_TABLES or table_name.startswith((_QUARANTINE_PREFIX, _STAGING_PREFIX))
 
 def table_exists(conn, table_name: str) -> bool:
     cur = conn.cursor()
@@ -47,3 +63,248 @@ def find_available_table_name(conn, base_name: str) -> str:
             suffix += 1
     finally:
         cur.close()
+
+def catalog_snapshot(conn) -> dict:
+    """Return {table: {column: type}} for every public table/view in one pg_catalog query."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT c.relname, a.attname, format_type(a.atttypid, a.atttypmod)
+            FROM pg_catalog.pg_class c
+            JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            LEFT JOIN pg_catalog.pg_attribute a
+                ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+            WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+            ORDER BY c.relname, a.attnum
+            """
+        )
+        catalog = {}
+        for table, column, col_type in cur.fetchall():
+            cols = catalog.setdefault(table, {})
+            if column is not None:
+                cols[column] = col_type
+        return catalog
+    finally:
+        cur.close()
+
+def schema_fingerprint(conn) -> str:
+    """md5 over every public table/view's columns and types; changes with any DDL, from any process."""
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT md5(coalesce(string_agg(
+                c.relname || '.' || coalesce(a.attname, '') || ' ' || coalesce(format_type(a.atttypid, a.atttypmod), ''),
+                ',' ORDER BY c.relname, a.attnum
+            ), ''))
+            FROM pg_catalog.pg_class c
+            JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            LEFT JOIN pg_catalog.pg_attribute a
+                ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+            WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+            """
+        )
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+
+# Per-database (schema fingerprint, catalog snapshot); refreshed after DDL run by this
+# code, or when a verified lookup sees another process changed the schema
+_catalogs = {}
+_catalog_lock = threading.Lock()
+
+def get_catalog(conn, dbname: str, verify: bool = False) -> dict:
+    """Cached catalog_snapshot for dbname.
+
+    With verify=True the snapshot is first checked against schema_fingerprint
+    (one single-row query), so tables created, versioned or dropped by other
+    processes are seen. Use it under erp_write_lock before any DDL or
+    versioning decision.
+    """
+    cached = _catalogs.get(dbname)
+    if cached is not None and not verify:
+        return cached[1]
+    # Fingerprint before snapshot: DDL in between only makes the next check refresh again
+    fingerprint = schema_fingerprint(conn)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+    catalog = catalog_snapshot(conn)
+    with _catalog_lock:
+        _catalogs[dbname] = (fingerprint, catalog)
+    return catalog
+
+def invalidate_catalog(dbname: str):
+    """Forget the cached snapshot after creating, altering or dropping tables in dbname."""
+    with _catalog_lock:
+        _catalogs.pop(dbname, None)
+
+def next_table_version(catalog: dict, base_name: str) -> str:
+    """Like find_available_table_name, but answered from a catalog snapshot."""
+    suffix = 1
+    while f"{base_name}_{suffix}" in catalog:
+        suffix += 1
+    return f"{base_name}_{suffix}"
+
+def create_erp_table(cur, table_name: str, pg_types: dict):
+    """Create an ERP table with the given {column: pg_type} plus its row fingerprint."""
+    col_defs = [
+        sql.SQL("{} {}").format(sql.Identifier(c), sql.SQL(t))
+        for c, t in pg_types.items()
+    ]
+    col_defs.append(sql.SQL("{} uuid UNIQUE").format(sql.Identifier(ROW_FP_COLUMN)))
+    cur.execute(
+        sql.SQL("CREATE TABLE {} ({})").format(
+            sql.Identifier(table_name), sql.SQL(", ").join(col_defs)
+        )
+    )
+
+def _row_fp_expr(columns) -> sql.Composable:
+    """md5 over the row's canonical text form, stored as a 16-byte uuid."""
+    cols = sql.SQL(", ").join(sql.Identifier(c) for c in columns)
+    return sql.SQL("md5(ROW({})::text)::uuid").format(cols)
+
+def add_row_fingerprint(cur, table_name: str, columns):
+    """Backfill the row fingerprint column and unique index on a pre-fingerprint table.
+
+    Runs once per legacy table; existing duplicate rows are collapsed so the
+    unique index can be built.
+    """
+    table = sql.Identifier(table_name)
+    fp = sql.Identifier(ROW_FP_COLUMN)
+    cur.execute(sql.SQL("ALTER TABLE {} ADD COLUMN IF NOT EXISTS {} uuid").format(table, fp))
+    cur.execute(
+        sql.SQL("UPDATE {} SET {} = {} WHERE {} IS NULL").format(
+            table, fp, _row_fp_expr(columns), fp
+        )
+    )
+    cur.execute(
+        sql.SQL("DELETE FROM {t} a USING {t} b WHERE a.{fp} = b.{fp} AND a.ctid > b.ctid").format(
+            t=table, fp=fp
+        )
+    )
+    cur.execute(
+        sql.SQL("CREATE UNIQUE INDEX IF NOT EXISTS {} ON {} ({})").format(
+            sql.Identifier(f"{table_name}_{ROW_FP_COLUMN}_key"[:63]), table, fp
+        )
+    )
+
+def create_staging_table(cur, table_name: str, columns) -> str:
+    """Create a session-private staging copy of table_name's data columns, dropped on commit.
+
+    Temp tables are never WAL-logged, so COPYing a batch into one costs no more
+    than an UNLOGGED table and needs no cleanup if the upload fails. COPY into
+    it must list the data columns; STAGE_ROW_COLUMN numbers the rows in input
+    order so merge_staging_table can report which ones it inserted.
+    """
+    staging = f"{_STAGING_PREFIX}{table_name}"[:63]
+    cur.execute(
+        sql.SQL("CREATE TEMP TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA").format(
+            sql.Identifier(staging),
+            sql.SQL(", ").join(sql.Identifier(c) for c in columns),
+            sql.Identifier(table_name),
+        )
+    )
+    cur.execute(
+        sql.SQL("ALTER TABLE {} ADD COLUMN {} bigint GENERATED ALWAYS AS IDENTITY").format(
+            sql.Identifier(staging), sql.Identifier(STAGE_ROW_COLUMN)
+        )
+    )
+    return staging
+
+def drop_staging_table(cur, staging: str):
+    """Drop a merged staging table, so the next chunk in the same transaction can create it again."""
+    cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(staging)))
+
+def merge_staging_table(cur, staging: str, table_name: str, columns):
+    """Insert the distinct staged rows whose fingerprint is new.
+
+    Rows with nulls never reach staging (validate_frame quarantines them before
+    COPY), so the batch is only fingerprinted and de-duplicated on its own, and
+    rows already in the table are skipped via the unique fingerprint index.
+    Returns (new_rows, already_present_rows, inserted) where inserted lists the
+    STAGE_ROW_COLUMN numbers of the rows actually inserted.
+    """
+    cols = sql.SQL(", ").join(sql.Identifier(c) for c in columns)
+    fp = sql.Identifier(ROW_FP_COLUMN)
+    stage_row = sql.Identifier(STAGE_ROW_COLUMN)
+    # Temp tables are never auto-analyzed; give the planner real batch stats
+    cur.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(staging)))
+    cur.execute(
+        sql.SQL("""
+            WITH batch AS (
+                SELECT DISTINCT ON ({fp}) *
+                FROM (SELECT {cols}, {stage_row}, {fp_expr} AS {fp} FROM {staging}) s
+            ), ins AS (
+                INSERT INTO {target} ({cols}, {fp})
+                SELECT {cols}, {fp} FROM batch
+                ON CONFLICT ({fp}) DO NOTHING
+                RETURNING {fp}
+            )
+            SELECT array(SELECT b.{stage_row} FROM batch b JOIN ins USING ({fp})), (SELECT count(*) FROM batch)
+        """).format(
+            target=sql.Identifier(table_name),
+            staging=sql.Identifier(staging),
+            cols=cols,
+            fp=fp,
+            stage_row=stage_row,
+            fp_expr=_row_fp_expr(columns),
+        )
+    )
+    inserted, distinct_rows = cur.fetchone()
+    return len(inserted), distinct_rows - len(inserted), inserted
+
+def quarantine_table_name(erp_name: str) -> str:
+    return f"{_QUARANTINE_PREFIX}{erp_name}"[:63]
+
+def write_quarantine(cur, erp_name: str, spool) -> str:
+    """Bulk-COPY a QuarantineSpool's rejected rows into the ERP's quarantine table.
+
+    The table stores each row as jsonb, so it serves every version of the ERP
+    table regardless of its columns. Returns the quarantine table name.
+    """
+    name = quarantine_table_name(erp_name)
+    table = sql.Identifier(name)
+    # IF NOT EXISTS is not atomic against a concurrent CREATE; serialize it
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [name])
+    cur.execute(
+        sql.SQL("""
+            CREATE TABLE IF NOT EXISTS {} (
+                id bigserial PRIMARY KEY,
+                table_name text,
+                file_hash text,
+                reason text,
+                row_data jsonb,
+                quarantined_at timestamptz default now()
+            )
+        """).format(table)
+    )
+    cur.copy_expert(
+        sql.SQL("COPY {} (table_name, file_hash, reason, row_data) FROM STDIN WITH CSV").format(table),
+        spool.reader(),
+    )
+    return name
+
+@contextmanager
+def erp_write_lock(conn, erp_name: str):
+    """Hold a session advisory lock on erp_name for the duration of an upload.
+
+    Uploads to the same ERP (from any thread or process) run one at a time, so
+    the dedupe check, table versioning and merge each see the previous upload's
+    result. A session lock survives the upload's intermediate commits; if the
+    unlock fails the connection is closed, which releases it.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_advisory_lock(hashtext(%s))", [f"upload:{erp_name}"])
+        yield
+    finally:
+        try:
+            if conn.get_transaction_status() == extensions.TRANSACTION_STATUS_INERROR:
+                conn.rollback()
+            cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", [f"upload:{erp_name}"])
+            conn.commit()
+        except psycopg2.Error:
+            conn.close()
+        finally:
+            cur.close()
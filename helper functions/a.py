@@ -13,6 +13,8 @@ from langchain_community.tools.sql_database.tool import (
 import os
 import re
 from datetime import datetime
+from utils.schema_index import build_schema_index, table_ddl_tokens, record_pruning
+from services.profiled_database import ProfiledSQLDatabase
 
 # ======================
 # SECURITY CONFIGURATION
@@ -37,11 +39,11 @@ db_name = "user_1" #os.getenv("DB_NAME", "user_1")                 # Your databa
 def get_db_connection() -> SQLDatabase:
     """Safely create PostgreSQL connection with validation"""
     try:
-        db = SQLDatabase.from_uri(
+        db = ProfiledSQLDatabase.from_uri(
             f"postgresql+psycopg2://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}",
             include_tables=None,  # Auto-detect all tables
             ignore_tables=None,
-            sample_rows_in_table_info=3,  # Show sample data for context
+            sample_rows_in_table_info=3,  # Sample data only for tables without an upload profile
             view_support=True
         )
         
@@ -92,6 +94,12 @@ tools = [
 # Map tool names to instances for easy access
 tool_map = {tool.name: tool for tool in tools}
 
+# Rank tables against each question (names, columns and profiled values) so only the
+# top-k schemas go into the prompt
+SCHEMA_TOP_K = 5
+schema_index = build_schema_index(db, table_text=db.profile_text())
+schema_ddl_tokens = table_ddl_tokens(db)
+
 # ======================
 # POSTGRESQL-SPECIFIC ENHANCEMENTS
 # ======================
@@ -152,22 +160,28 @@ def get_schema(state: MessagesState) -> Dict[str, Any]:
             "No specific question"
         )
         
-        # Focus schema retrieval on relevant tables
-        relevant_tables = []
-        if "artist" in last_user_msg.lower():
-            relevant_tables.append("Artist")
-        if "track" in last_user_msg.lower() or "song" in last_user_msg.lower():
-            relevant_tables.append("Track")
+        # Focus schema retrieval on the tables most relevant to the question (BM25);
+        # with no lexical match at all, fall back to every table
+        relevant_tables = schema_index.top_tables(last_user_msg, SCHEMA_TOP_K)
+        if not relevant_tables:
+            relevant_tables = db.get_usable_table_names()
         
         tool = tool_map["sql_db_schema"]
         tool_call = {
             "name": tool.name,
-            "args": {"table_names": relevant_tables} if relevant_tables else {},
+            "args": {"table_names": ", ".join(relevant_tables)},
             "id": f"schema_{datetime.now().strftime('%H%M%S')}",
             "type": "tool_call"
         }
         
         tool_response = tool.invoke(tool_call["args"])
+
+        # Prompt size metrics: estimated schema tokens sent vs. all tables
+        tokens_full = sum(schema_ddl_tokens.values())
+        tokens_sent = sum(schema_ddl_tokens.get(t, 0) for t in relevant_tables)
+        record_pruning(len(schema_ddl_tokens), len(relevant_tables), tokens_full, tokens_sent)
+        print(f"📉 Schema context: {len(relevant_tables)}/{len(schema_ddl_tokens)} tables, "
+              f"~{tokens_sent}/{tokens_full} tokens")
         return {
             "messages": [
                 AIMessage(content="", tool_calls=[tool_call]),
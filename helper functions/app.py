@@ -2,23 +2,36 @@ import traceback
 import time
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException
 from fastapi.responses import JSONResponse
-from services.uploader import upload_erp_data
+from fastapi.concurrency import run_in_threadpool
+from services.upload_jobs import enqueue_upload, job_status, start_workers
 from services.delete import delete_erp
+from utils.readers import upload_extension
 import requests
 import traceback
-import os
-import tempfile
-import os
 
-ALLOWED_EXTENSIONS = {".csv", ".xls", ".xlsx"}
+ALLOWED_EXTENSIONS = {
+    ".csv", ".xls", ".xlsx",
+    ".csv.gz", ".xls.gz", ".xlsx.gz", ".csv.bz2", ".xls.bz2", ".xlsx.bz2", ".zip",
+    ".parquet", ".arrow", ".feather", ".ipc",
+}
 
 app = FastAPI(title="ERP Data Uploader API", version="1.0.0")
 
+@app.on_event("startup")
+def start_upload_workers():
+    # More workers can run elsewhere with: python -m services.upload_jobs
+    app.state.upload_workers = start_workers()
+
+@app.on_event("shutdown")
+def stop_upload_workers():
+    app.state.upload_workers.set()
+
 @app.post("/upload-erp/")
 async def upload_erp_endpoint(
     user_id: str = Form(...),
     erp_name: str = Form(...),
-    files: list[UploadFile] = File(...)  
+    files: list[UploadFile] = File(...),
+    workbook: bool = Form(False)  # load every sheet of Excel files as its own table
 ):
     start_time = time.time()
 
@@ -27,29 +40,23 @@ async def upload_erp_endpoint(
 
     results = []
     for file in files:
-        ext = os.path.splitext(file.filename)[1].lower()
+        ext = upload_extension(file.filename)
         if ext not in ALLOWED_EXTENSIONS:
             results.append({
                 "file_name": file.filename,
                 "status": "error",
-                "message": f"Invalid file type '{ext}'. Only CSV, XLS, XLSX are allowed."
+                "message": f"Invalid file type '{ext}'. Only CSV, XLS, XLSX (optionally .gz, .bz2 or .zip compressed), Parquet and Arrow are allowed."
             })
             continue  # Skip invalid files
 
         try:
-            # Save file temporarily
-            temp_dir = tempfile.mkdtemp()
-            file_path = os.path.join(temp_dir, file.filename)
-            with open(file_path, "wb") as f:
-                f.write(await file.read())
-
-            # Run the ERP data upload logic for each file
-            upload_erp_data(user_id, erp_name, file_path)
-
+            # Persist the file (hashing it in the same pass) and queue it for a worker
+            job_id = await run_in_threadpool(enqueue_upload, user_id, erp_name, file.filename, file.file, workbook)
             results.append({
                 "file_name": file.filename,
-                "status": "success",
-                "message": "ERP data uploaded successfully"
+                "status": "queued",
+                "job_id": job_id,
+                "message": f"Poll /jobs/{job_id} for progress"
             })
 
         except Exception as exc:
@@ -62,12 +69,19 @@ async def upload_erp_endpoint(
             })
 
     execution_time = round(time.time() - start_time, 2)
-    return JSONResponse(content={
-        "status": "completed",
+    return JSONResponse(status_code=202, content={
+        "status": "queued",
         "execution_time_seconds": execution_time,
         "results": results
     })
 
+@app.get("/jobs/{job_id}")
+async def job_status_endpoint(job_id: int):
+    job = await run_in_threadpool(job_status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return JSONResponse(content=job)
+
 @app.post("/delete-erp/")
 async def upload_erp_endpoint(
     user_id: str = Form(...),
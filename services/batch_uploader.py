@@ -0,0 +1,258 @@
+import os
+import threading
+import traceback
+import multiprocessing
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config.settings import UPLOAD_PARSE_PROCESSES, UPLOAD_MAX_CONCURRENT_COPIES
+from services.uploader import upload_erp_data, upload_erp_sheets
+from db.connections import app_connection
+from db.schema_utils import ensure_tenant
+from db.audit_utils import last_upload_for_erp
+from utils.file_utils import sanitize_name
+from utils.readers import (
+    spool_file_chunks,
+    spool_sheet_chunks,
+    iter_spooled_chunks,
+    workbook_sheet_names,
+    WORKBOOK_EXTENSIONS,
+)
+from utils.parse_cache import cacheable, has_parsed, warm_cache
+
+# A file already saved to disk (and hashed while saving) by the caller; workbook
+# items load every sheet (see upload_erp_workbook) instead of only the first
+BatchItem = namedtuple(
+    "BatchItem", ["user_id", "erp_name", "file_name", "path", "file_hash", "workbook"], defaults=(False,)
+)
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    """Process pool for file parsing, started on first use and kept until a dead worker breaks it.
+
+    Uses spawn so workers never inherit the parent's threads or open DB connections.
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=UPLOAD_PARSE_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _parse_pool
+
+def _reset_parse_pool(pool: ProcessPoolExecutor):
+    """Drop pool if it is still the current one, so the next submit starts a fresh pool."""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is pool:
+            _parse_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _submit_to_pool(fn, *args):
+    """Submit fn(*args) to the parse pool, replacing the pool once if a dead worker broke it."""
+    pool = _get_parse_pool()
+    try:
+        future = pool.submit(fn, *args)
+    except BrokenProcessPool:
+        _reset_parse_pool(pool)
+        pool = _get_parse_pool()
+        future = pool.submit(fn, *args)
+    future.parse_call = (pool, fn, args)
+    return future
+
+def _parse_result(future):
+    """future.result() for a parse; one that died with its pool is run once more in a fresh pool."""
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        pool, fn, args = future.parse_call
+        _reset_parse_pool(pool)
+        return _submit_to_pool(fn, *args).result()
+
+def _group_key(item: BatchItem):
+    try:
+        return sanitize_name(item.user_id), sanitize_name(item.erp_name)
+    except ValueError:
+        # upload_erp_data reports the bad name as this file's error
+        return item.user_id, item.erp_name
+
+def _last_file_hash(user_id: str, erp_name: str):
+    """Hash of the ERP's last successful upload; None when there is none or it cannot be read."""
+    try:
+        with app_connection(ensure_tenant(sanitize_name(user_id))) as conn:
+            last = last_upload_for_erp(conn, sanitize_name(erp_name))
+            conn.rollback()
+    except Exception:
+        # The loader runs the same check and reports the error
+        return None
+    return last["file_hash"] if last else None
+
+def _submit_sheets(file_path: str, sheet_names=None) -> list:
+    """Start parsing every sheet of a workbook in the pool; returns [(sheet, future of spool path)]."""
+    if sheet_names is None:
+        sheet_names = workbook_sheet_names(file_path)
+    return [(sheet, _submit_to_pool(spool_sheet_chunks, file_path, sheet)) for sheet in sheet_names]
+
+def _discard_spools(futures):
+    """Cancel pending sheet parses and remove the spools of finished ones."""
+    for future in futures:
+        if future.cancel():
+            continue
+        try:
+            spool_path = future.result()
+        except Exception:
+            continue
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+
+def _sheet_chunks(future):
+    # Waits for the sheet's parse only when the loader gets to it
+    spool_path = _parse_result(future)
+    try:
+        yield from iter_spooled_chunks(spool_path)
+    finally:
+        # A parse retried after a broken pool has a spool _discard_spools does not know about
+        if os.path.exists(spool_path):
+            os.remove(spool_path)
+
+def upload_erp_workbook(user_id: str, erp_name: str, file_path: str, file_hash: str = None, progress=None,
+                        sheets=None) -> list:
+    """Load every sheet of an .xlsx/.xls workbook as its own table (see upload_erp_sheets).
+
+    The sheets are parsed concurrently in the process pool; loading starts with
+    the first sheet as soon as it is parsed while the rest are still parsing.
+    sheets, if given, are parses already started with _submit_sheets; otherwise
+    parsing starts only after upload_erp_sheets has ruled out a re-upload.
+    """
+    sheet_names = [sheet for sheet, _ in sheets] if sheets is not None else workbook_sheet_names(file_path)
+    started = dict(sheets) if sheets is not None else {}
+
+    def sheet_chunks(sheet):
+        if not started:
+            started.update(_submit_sheets(file_path, sheet_names))
+        return _sheet_chunks(started[sheet])
+
+    try:
+        return upload_erp_sheets(
+            user_id, erp_name, file_path, sheet_names, sheet_chunks, file_hash=file_hash, progress=progress,
+        )
+    finally:
+        _discard_spools(started.values())
+
+def _submit_parse(item: BatchItem, repeat: bool = False):
+    """Start parsing item in the pool; None when its parse is already cached or not needed.
+
+    repeat means item is expected to be its ERP's last upload again, which the
+    loader skips without reading it.
+    """
+    if repeat:
+        return None
+    if item.workbook:
+        try:
+            return _submit_sheets(item.path)
+        except Exception as exc:
+            # Reported as this file's error when its turn to load comes
+            return exc
+    if item.file_hash and cacheable(item.path):
+        if has_parsed(item.file_hash):
+            return None
+        return _submit_to_pool(warm_cache, item.path, item.file_hash)
+    return _submit_to_pool(spool_file_chunks, item.path)
+
+def _load_group(items, parsed) -> list:
+    """Load one ERP's files in order, each as soon as its parse finishes."""
+    results = []
+    for item, future in zip(items, parsed):
+        spool_path = None
+        try:
+            if item.workbook:
+                if isinstance(future, Exception):
+                    raise future
+                loaded = upload_erp_workbook(
+                    item.user_id, item.erp_name, item.path, file_hash=item.file_hash, sheets=future,
+                )
+                results.append({
+                    "file_name": item.file_name,
+                    "status": "success",
+                    "message": (
+                        "Loaded sheets: " + ", ".join(f"{sheet} -> {table}" for sheet, table, _ in loaded)
+                        if loaded else "No changes since last upload"
+                    )
+                })
+                continue
+            spool_path = _parse_result(future) if future else None
+            upload_erp_data(
+                item.user_id, item.erp_name, item.path, file_hash=item.file_hash,
+                # None: the parse went to the parse cache or was skipped as a likely
+                # re-upload; upload_erp_data then dedupes and reads the file itself
+                chunks=iter_spooled_chunks(spool_path) if spool_path else None,
+            )
+            results.append({
+                "file_name": item.file_name,
+                "status": "success",
+                "message": "ERP data uploaded successfully"
+            })
+        except Exception as exc:
+            results.append({
+                "file_name": item.file_name,
+                "status": "error",
+                "message": str(exc),
+                "traceback": traceback.format_exc()
+            })
+        finally:
+            if spool_path and os.path.exists(spool_path):
+                os.remove(spool_path)
+    return results
+
+def upload_batch(items) -> list:
+    """Upload many saved files, returning one result dict per item in input order.
+
+    Every file (every sheet, for workbook items) is parsed in the process pool
+    right away, into the parse cache when it is enabled (files already cached
+    are not parsed again). Files whose hash matches the upload that will precede
+    them (the ERP's last upload, or the previous file for the same ERP in the
+    batch) are not parsed, since the loader skips them as re-uploads before
+    reading. Files for the same ERP are then loaded one at a
+    time in the order given, so the result matches
+    uploading them sequentially; different ERPs load concurrently, up to
+    UPLOAD_MAX_CONCURRENT_COPIES at once.
+    """
+    items = list(items)
+    # Expected last-upload hash of each ERP as its items load in order
+    last_hash = {}
+    parsed = []
+    for item in items:
+        key = _group_key(item)
+        if key not in last_hash:
+            last_hash[key] = _last_file_hash(item.user_id, item.erp_name)
+        repeat = item.file_hash is not None and item.file_hash == last_hash[key]
+        parsed.append(_submit_parse(item, repeat))
+        last_hash[key] = item.file_hash
+
+    groups = OrderedDict()
+    for i, item in enumerate(items):
+        groups.setdefault(_group_key(item), []).append(i)
+
+    results = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=UPLOAD_MAX_CONCURRENT_COPIES) as loaders:
+        futures = {
+            loaders.submit(_load_group, [items[i] for i in idx], [parsed[i] for i in idx]): idx
+            for idx in groups.values()
+        }
+        for future, idx in futures.items():
+            for i, result in zip(idx, future.result()):
+                results[i] = result
+    return results
+
+def upload_erp_files(user_id: str, erp_name: str, files, workbook: bool = False) -> list:
+    """upload_batch for one ERP; files are (file_name, path, file_hash) tuples.
+
+    With workbook=True, Excel files load every sheet as its own table.
+    """
+    return upload_batch(
+        BatchItem(user_id, erp_name, *f, workbook=workbook and f[1].lower().endswith(WORKBOOK_EXTENSIONS))
+        for f in files
+    )
@@ -5,41 +5,60 @@ from psycopg2 import sql
 from config.settings import MAX_UPLOAD_BYTES
 from utils.file_utils import sanitize_name, file_sha256, df_to_csv_buffer
 from utils.type_mapping import pg_type_from_pd
-from db.connections import app_connect
-from db.schema_utils import create_user_database, ensure_audit_table
-from db.table_utils import table_exists, get_table_columns, find_available_table_name
+from db.connections import app_connection
+from db.schema_utils import ensure_tenant, forget_tenant
+from db.table_utils import invalidate_catalog
 from db.audit_utils import last_upload_for_table
+from db.profile_utils import delete_profiles
 
 def delete_erp(user_id: str, erp_name: str):
     user_id_s = sanitize_name(user_id)
     erp_name_s = sanitize_name(erp_name)
     table_name = f"{erp_name_s}"
 
-    dbname = create_user_database(user_id_s)
-    ensure_audit_table(dbname)
-
-    conn = app_connect(dbname)
-    cur = conn.cursor()
-
-    try:
-        # Delete from audit log
-        cur.execute(
-            sql.SQL("DELETE FROM upload_audit WHERE table_name = %s AND user_id = %s"),
-            [table_name, user_id_s]
-        )
-
-        # Drop the ERP table
-        cur.execute(
-            sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(table_name))
-        )
-
-        conn.commit()
-        print(f"Deleted table '{table_name}' and audit records successfully.")
-
-    except Exception as e:
-        conn.rollback()
-        traceback.print_exc()
-        raise
-    finally:
-        cur.close()
-        conn.close()
+    dbname = ensure_tenant(user_id_s)
+
+    with app_connection(dbname) as conn:
+        cur = conn.cursor()
+
+        try:
+            # Tables loaded from workbook sheets, named <erp>__<sheet>
+            cur.execute(
+                "SELECT DISTINCT table_name FROM upload_audit "
+                "WHERE erp_name = %s AND user_id = %s AND sheet_name IS NOT NULL",
+                [erp_name_s, user_id_s]
+            )
+            sheet_tables = [r[0] for r in cur.fetchall()]
+
+            # Delete from audit log
+            cur.execute(
+                sql.SQL("DELETE FROM upload_audit WHERE table_name = %s AND user_id = %s"),
+                [table_name, user_id_s]
+            )
+
+            # Forget partly loaded files so a later upload does not resume into the dropped table
+            cur.execute("DELETE FROM upload_checkpoints WHERE erp_name = %s", [erp_name_s])
+
+            # Drop the ERP table
+            cur.execute(
+                sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(table_name))
+            )
+            for sheet_table in sheet_tables:
+                cur.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(sheet_table)))
+            cur.execute(
+                "DELETE FROM upload_audit WHERE erp_name = %s AND user_id = %s AND sheet_name IS NOT NULL",
+                [erp_name_s, user_id_s]
+            )
+            delete_profiles(cur, [table_name] + sheet_tables)
+
+            conn.commit()
+            invalidate_catalog(dbname)
+            forget_tenant(dbname)
+            print(f"Deleted table '{table_name}' and audit records successfully.")
+
+        except Exception as e:
+            conn.rollback()
+            traceback.print_exc()
+            raise
+        finally:
+            cur.close()
@@ -0,0 +1,82 @@
+"""
+SQLDatabase whose schema context comes from the upload-time profile catalog.
+
+For tables with a table_profiles row, get_table_info returns the CREATE TABLE
+text plus the stored profile (row count, null rates, ranges, distinct counts,
+top values) instead of sampling rows from the live table. Tables without a
+profile keep the usual sample rows.
+
+Upload bookkeeping (checkpoints, profiles, quarantine tables) is not listed as
+usable, and the row fingerprint column is left out of every table's schema.
+"""
+import traceback
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy.exc import CompileError
+from sqlalchemy.schema import CreateTable, UniqueConstraint
+from db.table_utils import ROW_FP_COLUMN, internal_table
+from db.profile_utils import load_profiles
+from utils.profiling import format_profile, profile_terms
+
+
+class ProfiledSQLDatabase(SQLDatabase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._hide_row_fingerprints()
+
+    def _hide_row_fingerprints(self):
+        # Same in-place column removal SQLDatabase uses for NullType columns
+        for table in self._metadata.sorted_tables:
+            column = table.columns.get(ROW_FP_COLUMN)
+            if column is None:
+                continue
+            table._columns.remove(column)
+            for constraint in list(table.constraints):
+                if isinstance(constraint, UniqueConstraint) and ROW_FP_COLUMN in constraint.columns.keys():
+                    table.constraints.discard(constraint)
+
+    def get_usable_table_names(self):
+        return [t for t in super().get_usable_table_names() if not internal_table(t)]
+
+    def table_profiles(self, tables=None) -> dict:
+        """Stored profiles of the given tables (all when None), read over this database's engine."""
+        conn = self._engine.raw_connection()
+        try:
+            return load_profiles(conn, tables)
+        finally:
+            conn.close()
+
+    def profile_text(self) -> dict:
+        """{table: frequent text values}, extra text for ranking tables by relevance."""
+        return {t: profile_terms(p["columns"]) for t, p in self.table_profiles().items()}
+
+    def get_table_info(self, table_names=None, get_col_comments: bool = False) -> str:
+        # Tables reflected lazily by an earlier call get their fingerprint hidden too
+        self._hide_row_fingerprints()
+        names = list(table_names) if table_names is not None else list(self.get_usable_table_names())
+        try:
+            profiles = self.table_profiles(names)
+        except Exception:
+            # No catalog to read; sample the live tables instead
+            traceback.print_exc()
+            profiles = {}
+        if not profiles:
+            return super().get_table_info(table_names, get_col_comments)
+
+        meta = {t.name: t for t in self._metadata.sorted_tables}
+        infos, rest = [], []
+        for name in names:
+            if name not in profiles or name not in meta:
+                rest.append(name)
+                continue
+            try:
+                create_table = str(CreateTable(meta[name]).compile(self._engine)).rstrip()
+            except CompileError:
+                # Columns of types SQLAlchemy cannot render; let SQLDatabase handle the table
+                rest.append(name)
+                continue
+            profile = profiles[name]
+            infos.append(f"{create_table}\n\n/*\n{format_profile(profile['row_count'], profile['columns'])}\n*/")
+        if rest:
+            infos.append(super().get_table_info(rest, get_col_comments))
+        return "\n\n".join(sorted(infos))
@@ -0,0 +1,80 @@
+"""
+SQLDatabase (with profile-based schema context, see
+services.profiled_database) whose read queries are answered from the result
+cache while the tables they read are unchanged.
+
+A result is keyed by database, SQL text and the upload versions of every
+table the SQL names (see db.audit_utils.table_versions), so a new upload,
+committed chunk or delete of any of those tables makes it miss. Queries over
+tables without upload history, and queries whose result depends on when they
+run (now(), CURRENT_DATE, random(), ...), are always run.
+"""
+import re
+import traceback
+from services.profiled_database import ProfiledSQLDatabase
+from db.connections import app_connection
+from db.audit_utils import table_versions
+from utils.result_cache import result_key, get_rows, put_rows
+
+_IDENTIFIER_RE = re.compile(r'"((?:[^"]|"")+)"|([A-Za-z_][A-Za-z0-9_$]*)')
+_READ_ONLY_RE = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+# Time, random and sequence functions plus 'today'-style literals; a column that happens
+# to share one of these names only costs a cache miss
+_VOLATILE_RE = re.compile(
+    r"\b(now|current_date|current_time|current_timestamp|localtime|localtimestamp|clock_timestamp"
+    r"|statement_timestamp|transaction_timestamp|timeofday|age|random|setseed|gen_random_uuid"
+    r"|nextval|currval)\b|'(now|today|yesterday|tomorrow)'",
+    re.IGNORECASE,
+)
+
+
+def referenced_tables(sql_text: str, tables) -> set:
+    """Names in tables that sql_text mentions as an identifier, quoted or not.
+
+    Over-matching (a column named like a table) only adds a version to the key.
+    """
+    tables = set(tables)
+    found = set()
+    for quoted, bare in _IDENTIFIER_RE.findall(sql_text):
+        name = quoted.replace('""', '"') if quoted else bare.lower()
+        if name in tables:
+            found.add(name)
+    return found
+
+
+class CachedSQLDatabase(ProfiledSQLDatabase):
+
+    def _result_key(self, command: str, fetch: str):
+        if not _READ_ONLY_RE.match(command) or _VOLATILE_RE.search(command):
+            return None
+        tables = referenced_tables(command, self.get_usable_table_names())
+        if not tables:
+            return None
+        dbname = self._engine.url.database
+        with app_connection(dbname) as conn:
+            versions = table_versions(conn, tables)
+            conn.rollback()
+        if versions is None:
+            return None
+        return result_key(dbname, command.strip(), fetch, sorted(versions.items()))
+
+    def _execute(self, command, fetch="all", **kwargs):
+        if not isinstance(command, str) or fetch not in ("all", "one") or kwargs.get("parameters"):
+            return super()._execute(command, fetch, **kwargs)
+        try:
+            key = self._result_key(command, fetch)
+            rows = get_rows(key) if key else None
+        except Exception:
+            # The cache is an optimization; fall back to running the query
+            traceback.print_exc()
+            key = rows = None
+        if rows is not None:
+            return rows
+
+        rows = super()._execute(command, fetch, **kwargs)
+        if key:
+            try:
+                put_rows(key, rows)
+            except Exception:
+                traceback.print_exc()
+        return rows
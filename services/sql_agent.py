@@ -0,0 +1,222 @@
+"""
+Warm question-answering resources, reused across questions, and the
+question -> SQL cache.
+
+Building an agent means reflecting the whole database schema (SQLDatabase),
+creating a chat client and compiling the ReAct graph. Those are kept per
+(database, model, prompt version) and rebuilt only when the database's schema
+fingerprint changes, i.e. after an upload or delete changed its tables.
+"""
+import re
+import threading
+import traceback
+from collections import OrderedDict, namedtuple
+from config.settings import (
+    DB_APP_USER, DB_APP_PWD, DB_HOST, DB_PORT,
+    AGENT_MODEL, AGENT_API_BASE, AGENT_CACHE_MAX_DATABASES,
+)
+from db.connections import app_connection
+from db.table_utils import schema_fingerprint
+from db.question_cache_utils import lookup_sql, store_sql, forget_sql
+
+# Bump when SYSTEM_PROMPT changes so cached agents built with the old prompt are dropped
+PROMPT_VERSION = 1
+
+SYSTEM_PROMPT = """
+You are an agent designed to interact with a PostgreSQL database.
+IMPORTANT: This database uses case-sensitive column names that MUST be quoted with double quotes.
+For example, use "Discount_Band" instead of Discount_Band.
+Given an input question, create a syntactically correct {dialect} query to run,
+then look at the results of the query and return the answer. Unless the user
+specifies a specific number of examples they wish to obtain, always limit your
+query to at most {top_k} results.
+
+You can order the results by a relevant column to return the most interesting
+examples in the database. Never query for all the columns from a specific table,
+only ask for the relevant columns given the question.
+
+You MUST double check your query before executing it. If you get an error while
+executing a query, rewrite the query and try again.
+
+DO NOT make any DML statements (INSERT, UPDATE, DELETE, DROP etc.) to the
+database.
+
+To start you should ALWAYS look at the tables in the database to see what you
+can query. Do NOT skip this step.
+
+Then you should query the schema of the most relevant tables.
+"""
+
+# Used on question cache hits, where the SQL is already known and only its result needs wording
+ANSWER_PROMPT = """
+You answer questions about a PostgreSQL database. The SQL query below was run
+to answer the user's question; reply to the question using only its result.
+If the result is empty, say that no matching data was found.
+"""
+
+AgentResources = namedtuple("AgentResources", ["fingerprint", "api_key", "db", "llm", "agent"])
+
+_agents = OrderedDict()  # (dbname, model, PROMPT_VERSION) -> AgentResources, least recently used first
+_llms = {}  # (model, api_key) -> chat client; stateless, so shared by every database
+_lock = threading.Lock()
+# One builder per key at a time, so concurrent first questions reflect the schema once
+_build_locks = {}
+
+
+def database_uri(dbname: str) -> str:
+    return f"postgresql+psycopg2://{DB_APP_USER}:{DB_APP_PWD}@{DB_HOST}:{DB_PORT}/{dbname}"
+
+
+def _get_llm(model: str, api_key: str):
+    from langchain_openai import ChatOpenAI
+
+    with _lock:
+        llm = _llms.get((model, api_key))
+        if llm is None:
+            llm = ChatOpenAI(model=model, temperature=0, openai_api_key=api_key, openai_api_base=AGENT_API_BASE)
+            _llms[(model, api_key)] = llm
+        return llm
+
+
+def _build(dbname: str, model: str, api_key: str, fingerprint: str) -> AgentResources:
+    from langchain_community.agent_toolkits import SQLDatabaseToolkit
+    from langgraph.prebuilt import create_react_agent
+    from services.query_cache import CachedSQLDatabase
+
+    # Schema context comes from upload-time profiles instead of live sample rows, and query
+    # results are served from the result cache while the tables they read are unchanged
+    db = CachedSQLDatabase.from_uri(database_uri(dbname))
+    llm = _get_llm(model, api_key)
+    tools = SQLDatabaseToolkit(db=db, llm=llm).get_tools()
+    agent = create_react_agent(llm, tools, prompt=SYSTEM_PROMPT.format(dialect=db.dialect, top_k=5))
+    return AgentResources(fingerprint, api_key, db, llm, agent)
+
+
+def _dispose(resources: AgentResources):
+    # Close the replaced SQLDatabase's engine pool rather than waiting for GC
+    resources.db._engine.dispose()
+
+
+def get_agent(dbname: str, api_key: str, model: str = AGENT_MODEL) -> AgentResources:
+    """Warm SQLDatabase, chat client and compiled agent for dbname.
+
+    Costs one catalog query per call to compare schema fingerprints; the schema
+    is reflected again only when it changed since the agent was built.
+    """
+    key = (dbname, model, PROMPT_VERSION)
+    with app_connection(dbname) as conn:
+        fingerprint = schema_fingerprint(conn)
+        conn.rollback()
+
+    with _lock:
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+    with build_lock:
+        with _lock:
+            cached = _agents.get(key)
+            if cached is not None and cached.fingerprint == fingerprint and cached.api_key == api_key:
+                _agents.move_to_end(key)
+                return cached
+
+        resources = _build(dbname, model, api_key, fingerprint)
+        evicted = []
+        with _lock:
+            old = _agents.pop(key, None)
+            if old is not None:
+                evicted.append(old)
+            _agents[key] = resources
+            while len(_agents) > AGENT_CACHE_MAX_DATABASES:
+                old_key, old = _agents.popitem(last=False)
+                _build_locks.pop(old_key, None)
+                evicted.append(old)
+        for old in evicted:
+            _dispose(old)
+        return resources
+
+
+def get_database(dbname: str, api_key: str, model: str = AGENT_MODEL):
+    """The cached agent's SQLDatabase for dbname (reflected once, shared with the agent)."""
+    return get_agent(dbname, api_key, model).db
+
+
+def normalize_question(question: str) -> str:
+    """Cache key form of a question: case, spacing and trailing punctuation do not matter."""
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?.! ")
+
+
+def _final_sql(messages):
+    """The one query the agent ran successfully, or None if it ran none or several.
+
+    Several successful queries mean the answer combined them, which a single
+    cached statement cannot reproduce.
+    """
+    calls = {}
+    for message in messages:
+        for call in getattr(message, "tool_calls", None) or []:
+            if call["name"] == "sql_db_query":
+                calls[call["id"]] = call["args"].get("query")
+    succeeded = [
+        calls[m.tool_call_id]
+        for m in messages
+        if getattr(m, "type", None) == "tool" and m.tool_call_id in calls
+        and getattr(m, "status", "success") != "error" and not str(m.content).startswith("Error:")
+    ]
+    return succeeded[0] if len(succeeded) == 1 else None
+
+
+def _answer_from_sql(resources: AgentResources, question: str, sql_text: str) -> str:
+    result = resources.db.run(sql_text)
+    reply = resources.llm.invoke([
+        {"role": "system", "content": ANSWER_PROMPT},
+        {"role": "user", "content": f"Question: {question}\n\nSQL:\n{sql_text}\n\nResult:\n{result}"},
+    ])
+    return reply.content
+
+
+def answer_question(dbname: str, question: str, api_key: str, model: str = AGENT_MODEL) -> str:
+    """Answer question about dbname and return the final AI message.
+
+    A question asked before under the same schema fingerprint reuses the SQL
+    the agent settled on then: it is run directly and only the answer is
+    worded by the model, skipping the list tables/schema/write/check steps.
+    Otherwise the agent runs, and its single successful query is cached.
+    """
+    resources = get_agent(dbname, api_key, model)
+    question_key = normalize_question(question)
+
+    try:
+        cached_sql = lookup_sql(dbname, resources.fingerprint, question_key)
+    except Exception:
+        # The cache is an optimization; an unreachable cache table must not fail the question
+        traceback.print_exc()
+        cached_sql = None
+    if cached_sql is not None:
+        try:
+            return _answer_from_sql(resources, question, cached_sql)
+        except Exception:
+            # Fall back to the agent and let it cache a fresh query
+            traceback.print_exc()
+            try:
+                forget_sql(dbname, resources.fingerprint, question_key)
+            except Exception:
+                traceback.print_exc()
+
+    final_response = ""
+    messages = []
+    for step in resources.agent.stream(
+        {"messages": [{"role": "user", "content": question}]},
+        stream_mode="values",
+    ):
+        # Keep the content of the latest AI message
+        if "messages" in step and len(step["messages"]) > 0:
+            messages = step["messages"]
+            latest_message = messages[-1]
+            if hasattr(latest_message, "type") and latest_message.type == "ai":
+                final_response = latest_message.content
+
+    sql_text = _final_sql(messages)
+    if sql_text:
+        try:
+            store_sql(dbname, resources.fingerprint, question_key, sql_text)
+        except Exception:
+            traceback.print_exc()
+    return final_response
@@ -0,0 +1,152 @@
+"""
+Background upload jobs backed by the upload_jobs table.
+
+The API persists each file and enqueues a job; worker threads (in the API
+process or in standalone processes) claim jobs with SKIP LOCKED and run
+upload_erp_data, recording phase and rows copied as they go.
+
+    python -m services.upload_jobs --workers 4
+"""
+import os
+import time
+import uuid
+import argparse
+import threading
+import traceback
+from config.settings import UPLOAD_JOB_DIR, UPLOAD_JOB_WORKERS, UPLOAD_JOB_POLL_SECS, UPLOAD_JOB_HEARTBEAT_SECS
+from services.uploader import upload_erp_data
+from services.batch_uploader import upload_erp_workbook
+from utils.file_utils import sanitize_name, copy_and_hash
+from utils.readers import upload_extension, WORKBOOK_EXTENSIONS
+from db.job_utils import insert_job, claim_job, update_job, touch_job, get_job, fail_exhausted_jobs
+
+# Progress writes within a phase are throttled to one per this many seconds
+_PROGRESS_EVERY_SECS = 1.0
+
+def enqueue_upload(user_id: str, erp_name: str, file_name: str, src, workbook: bool = False) -> int:
+    """Save binary file object src under UPLOAD_JOB_DIR, hashing it in the same pass, and queue it.
+
+    Names are sanitized here so a bad name fails the request instead of the job.
+    With workbook=True an Excel file loads every sheet as its own table.
+    Returns the job id.
+    """
+    user_id_s = sanitize_name(user_id)
+    erp_name_s = sanitize_name(erp_name)
+    os.makedirs(UPLOAD_JOB_DIR, exist_ok=True)
+    ext = upload_extension(file_name)
+    workbook = workbook and ext in WORKBOOK_EXTENSIONS
+    file_path = os.path.join(UPLOAD_JOB_DIR, f"{uuid.uuid4().hex}{ext}")
+    try:
+        with open(file_path, "wb") as f:
+            file_hash = copy_and_hash(src, f)
+        return insert_job(user_id_s, erp_name_s, file_name, file_path, file_hash, workbook)
+    except Exception:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+def job_status(job_id: int):
+    """Job state for the status endpoint, or None if there is no such job."""
+    job = get_job(job_id)
+    if job is None:
+        return None
+    job.pop("file_path")
+    for k in ("created_at", "started_at", "updated_at", "finished_at"):
+        if job[k] is not None:
+            job[k] = job[k].isoformat()
+    return job
+
+def _progress_reporter(job_id: int):
+    last = {"phase": None, "at": 0.0}
+
+    def report(phase: str, rows: int):
+        now = time.monotonic()
+        if phase == last["phase"] and now - last["at"] < _PROGRESS_EVERY_SECS:
+            return
+        last.update(phase=phase, at=now)
+        try:
+            update_job(job_id, phase=phase, rows_copied=rows)
+        except Exception:
+            # A missed progress write must not fail the upload itself
+            traceback.print_exc()
+
+    return report
+
+def _heartbeat(job_id: int, stop: threading.Event):
+    # Keeps the job fresh while the upload waits on the ERP lock or sits in a long phase
+    while not stop.wait(UPLOAD_JOB_HEARTBEAT_SECS):
+        try:
+            touch_job(job_id)
+        except Exception:
+            traceback.print_exc()
+
+def _remove_file(file_path: str):
+    if file_path and os.path.exists(file_path):
+        os.remove(file_path)
+
+def run_job(job: dict):
+    """Run one claimed job to completion and record its outcome.
+
+    The saved file is removed once the outcome is recorded. If that write
+    fails the job stays 'running' and keeps its file, so it is reclaimed and
+    retried once stale (a finished upload is then skipped as a re-upload).
+    """
+    stop = threading.Event()
+    threading.Thread(
+        target=_heartbeat, args=(job["id"], stop), name=f"upload-job-{job['id']}-heartbeat", daemon=True,
+    ).start()
+    try:
+        upload = upload_erp_workbook if job["workbook"] else upload_erp_data
+        upload(
+            job["user_id"], job["erp_name"], job["file_path"],
+            file_hash=job["file_hash"], progress=_progress_reporter(job["id"]),
+        )
+        outcome = {"status": "success"}
+    except Exception as exc:
+        outcome = {"status": "error", "phase": "failed", "error": str(exc), "traceback": traceback.format_exc()}
+    finally:
+        stop.set()
+    try:
+        update_job(job["id"], **outcome)
+    except Exception:
+        traceback.print_exc()
+        return
+    _remove_file(job["file_path"])
+
+def worker_loop(stop: threading.Event):
+    """Claim and run jobs until stop is set, sleeping UPLOAD_JOB_POLL_SECS when the queue is empty."""
+    while not stop.is_set():
+        try:
+            for file_path in fail_exhausted_jobs():
+                _remove_file(file_path)
+            job = claim_job()
+        except Exception:
+            traceback.print_exc()
+            job = None
+        if job is None:
+            stop.wait(UPLOAD_JOB_POLL_SECS)
+            continue
+        try:
+            run_job(job)
+        except Exception:
+            # Never let one job end the worker thread
+            traceback.print_exc()
+
+def start_workers(count: int = UPLOAD_JOB_WORKERS):
+    """Start count daemon worker threads; returns the Event that stops them."""
+    stop = threading.Event()
+    for i in range(count):
+        threading.Thread(target=worker_loop, args=(stop,), name=f"upload-worker-{i}", daemon=True).start()
+    return stop
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run upload job workers.")
+    parser.add_argument("--workers", type=int, default=UPLOAD_JOB_WORKERS)
+    args = parser.parse_args()
+    stop = start_workers(args.workers)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stop.set()
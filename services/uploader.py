@@ -1,21 +1,233 @@
 import os
-import pandas as pd
+import itertools
 import traceback
+import pandas as pd
 from psycopg2 import sql
+from psycopg2.extras import Json
 from config.settings import MAX_UPLOAD_BYTES
-from utils.file_utils import sanitize_name, file_sha256, df_to_csv_buffer
-from utils.type_mapping import pg_type_from_pd
-from db.connections import app_connect
-from db.schema_utils import create_user_database, ensure_audit_table
-from db.table_utils import table_exists, get_table_columns, find_available_table_name
-from db.audit_utils import last_upload_for_table
+from utils.file_utils import sanitize_name, file_sha256, CsvChunkStream
+from utils.type_inference import infer_column_types, specs_for_table
+from utils.validation import validate_frame, QuarantineSpool
+from utils.readers import declared_column_specs, skip_rows
+from utils.parse_cache import parsed_chunks
+from utils.profiling import profile_frame, merge_profiles
+from utils.pgcopy import BinaryCopyStream, binary_copy_supported
+from db.connections import app_connection, session_timezone
+from db.schema_utils import ensure_tenant
+from db.table_utils import (
+    ROW_FP_COLUMN,
+    get_catalog,
+    invalidate_catalog,
+    next_table_version,
+    create_erp_table,
+    add_row_fingerprint,
+    create_staging_table,
+    merge_staging_table,
+    drop_staging_table,
+    write_quarantine,
+    erp_write_lock,
+)
+from db.profile_utils import load_profiles, save_profile, count_rows
+from db.audit_utils import last_upload_for_erp, last_sheet_upload, load_checkpoint, save_checkpoint, clear_checkpoint
+
+
+def _use_binary_copy(conn, first, table_types: dict) -> bool:
+    """Binary COPY when every column of a clean chunk encodes natively, else CSV."""
+    naive_ts = any(
+        pd.api.types.is_datetime64_any_dtype(first[c]) and getattr(first[c].dtype, "tz", None) is None
+        for c in table_types
+    )
+    naive_ok = not naive_ts or session_timezone(conn) in ("UTC", "Etc/UTC")
+    return binary_copy_supported(table_types, first, naive_timestamps_ok=naive_ok)
+
+
+def _read_first_chunks(file_path: str, chunks):
+    """Return (first chunk, all chunks, ColumnSpecs) for a stream of DataFrame chunks.
+
+    Typed formats (Parquet/Arrow) bring their own schema. Otherwise types are
+    inferred from the first chunk; peeking one chunk ahead tells whether that
+    was the whole file or a sample that needs integer headroom.
+    """
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None or first.empty:
+        raise ValueError("Uploaded file is empty.")
+    second = next(chunks, None)
+    specs = declared_column_specs(file_path) or infer_column_types(first, complete=second is None)
+    if second is not None:
+        chunks = itertools.chain([second], chunks)
+    return first, itertools.chain([first], chunks), specs
+
+
+def _load_table(conn, cur, dbname: str, erp_name_s: str, table_name: str, file_hash: str,
+                first, chunks, specs: dict, totals: dict, report, atomic: bool = False) -> str:
+    """Load chunks into table_name (or a new version of it) and return the table loaded.
+
+    totals is filled in place with the table name and running row counts, so
+    the caller can still report them when the load fails part way. Normally
+    each chunk is merged and checkpointed in its own transaction, and a
+    checkpoint for this file resumes into its table. With atomic=True nothing
+    is committed or checkpointed; the caller commits every table at once.
+    """
+    pg_types = {c: spec.pg_type for c, spec in specs.items()}
+
+    # -------- Resume a partly loaded copy of this file, or check schema changes --------
+    new_cols = list(first.columns)
+    # Other processes (API workers, Streamlit) may have changed the tables since this snapshot
+    catalog = get_catalog(conn, dbname, verify=True)
+    checkpoint = None if atomic else load_checkpoint(conn, erp_name_s, file_hash)
+    if checkpoint and [c for c in catalog.get(checkpoint["table_name"], {}) if c != ROW_FP_COLUMN] == new_cols:
+        table_name = checkpoint["table_name"]
+        print(f"Resuming upload into '{table_name}' after {checkpoint['rows_read']} rows.")
+    elif table_name in catalog:
+        checkpoint = None
+        existing_cols = list(catalog[table_name])
+        data_cols = [c for c in existing_cols if c != ROW_FP_COLUMN]
+
+        if data_cols != new_cols:
+            print(f"Schema change detected for table '{table_name}'. Creating new version.")
+            table_name = next_table_version(catalog, table_name)
+        elif ROW_FP_COLUMN not in existing_cols:
+            print(f"Adding row fingerprints to existing table '{table_name}'.")
+            add_row_fingerprint(cur, table_name, new_cols)
+            if not atomic:
+                conn.commit()
+                invalidate_catalog(dbname)
+    else:
+        checkpoint = None
+
+    totals.update(checkpoint or {
+        "rows_read": 0, "rows_copied": 0, "rows_new": 0, "rows_existing": 0,
+        "rows_rejected": 0, "reject_counts": {},
+    })
+    totals["table_name"] = table_name
+
+    # -------- Create table if not exists --------
+    if table_name not in catalog:
+        create_erp_table(cur, table_name, pg_types)
+        if not atomic:
+            # A retry after a failed first chunk reuses this table instead of versioning again
+            save_checkpoint(cur, erp_name_s, file_hash, table_name, totals)
+            conn.commit()
+            invalidate_catalog(dbname)
+        table_types = pg_types
+    else:
+        table_types = {c: catalog[table_name][c] for c in new_cols}
+        specs = specs_for_table(specs, table_types)
+
+    # -------- Profile of the table, extended with every chunk --------
+    profile = load_profiles(conn, [table_name]).get(table_name)
+    if profile is None:
+        # First profile of a table that may already hold rows from before profiling existed
+        profile = {"row_count": count_rows(cur, table_name), "columns": {}}
+
+    # -------- Load chunk by chunk --------
+    # Rows already loaded by an earlier attempt are skipped
+    frames = skip_rows(chunks, totals["rows_read"])
+    for raw in frames:
+        clean, rejected, counts = validate_frame(raw, specs)
+        # Decided per chunk: a later chunk may hold numbers only the CSV path loads exactly
+        use_binary = _use_binary_copy(conn, clean, table_types)
+
+        # Clean rows go through a staging table, merged by fingerprint
+        staging = create_staging_table(cur, table_name, new_cols)
+        if use_binary:
+            stream = BinaryCopyStream([clean], table_types)
+            copy_stmt = "COPY {} ({}) FROM STDIN WITH (FORMAT binary)"
+        else:
+            stream = CsvChunkStream([clean])
+            copy_stmt = "COPY {} ({}) FROM STDIN WITH CSV HEADER"
+        cur.copy_expert(
+            sql.SQL(copy_stmt).format(
+                sql.Identifier(staging), sql.SQL(", ").join(sql.Identifier(c) for c in new_cols)
+            ),
+            stream,
+        )
+        rows_new, rows_existing, inserted = merge_staging_table(cur, staging, table_name, new_cols)
+        drop_staging_table(cur, staging)
+
+        # Rejected rows go to the quarantine table in the same transaction
+        if len(rejected):
+            quarantine = QuarantineSpool(table_name, file_hash)
+            try:
+                quarantine.add(rejected, counts)
+                write_quarantine(cur, erp_name_s, quarantine)
+            finally:
+                quarantine.close()
+
+        # Only rows actually inserted count, so re-sent rows do not inflate the stats
+        added = clean.iloc[sorted(r - 1 for r in inserted)]
+        profile["columns"] = merge_profiles(profile["columns"], profile_frame(added))
+        profile["row_count"] += rows_new
+        save_profile(cur, table_name, profile["row_count"], profile["columns"])
+
+        totals["rows_read"] += len(raw)
+        totals["rows_copied"] += stream.rows
+        totals["rows_new"] += rows_new
+        totals["rows_existing"] += rows_existing
+        totals["rows_rejected"] += len(rejected)
+        for k, n in counts.items():
+            totals["reject_counts"][k] = totals["reject_counts"].get(k, 0) + n
+        if not atomic:
+            save_checkpoint(cur, erp_name_s, file_hash, table_name, totals)
+            conn.commit()
+        report("copying", totals["rows_copied"])
 
+    return table_name
 
-def upload_erp_data(user_id: str, erp_name: str, file_path: str):
+
+def insert_success_audit(cur, user_id_s: str, erp_name_s: str, table_name: str, file_hash: str,
+                         totals: dict, sheet_name: str = None):
+    cur.execute(
+        """
+        INSERT INTO upload_audit (user_id, erp_name, table_name, file_hash, rows, action, status,
+                                  rows_new, rows_existing, rows_rejected, reject_counts, sheet_name)
+        VALUES (%s, %s, %s, %s, %s, 'upload', 'success', %s, %s, %s, %s, %s)
+        """,
+        (user_id_s, erp_name_s, table_name, file_hash, totals["rows_read"], totals["rows_new"],
+         totals["rows_existing"], totals["rows_rejected"], Json(totals["reject_counts"]), sheet_name),
+    )
+
+
+def insert_failure_audit(conn, cur, user_id_s: str, erp_name_s: str, table_name: str, rows: int, error: str):
+    try:
+        cur.execute(
+            """
+            INSERT INTO upload_audit (user_id, erp_name, table_name, file_hash, rows, action, status, error)
+            VALUES (%s, %s, %s, %s, %s, 'upload', 'failure', %s)
+            """,
+            (user_id_s, erp_name_s, table_name, None, rows, error),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+
+
+def upload_erp_data(user_id: str, erp_name: str, file_path: str, file_hash: str = None, chunks=None,
+                    progress=None):
     """
-    Upload ERP Excel/CSV data into the user's dedicated Postgres DB.
+    Upload ERP Excel/CSV/Parquet data into the user's dedicated Postgres DB.
     Creates DB and table if not present, adds audit logs, and handles schema changes.
+    Pass file_hash when the caller already hashed the file while writing it; a
+    re-upload of the ERP's last file is then skipped before any parsing or DDL.
+    The file is read in CSV_CHUNK_ROWS chunks; each is COPYed (binary when every
+    column type allows it, CSV otherwise) into a staging table, merged and
+    checkpointed in its own transaction, so memory stays flat regardless of file
+    size and a retry of a failed upload of the same file resumes after its last
+    committed chunk. The parsed chunks are kept in the parse cache under the
+    file's SHA-256, so a later upload of the same bytes skips parsing. Only
+    rows whose row fingerprint is not already in the ERP table are merged, so
+    overlapping re-exports only add their delta. Rows with nulls,
+    unparseable values or out-of-range numbers are split off before COPY and
+    bulk-written to the ERP's quarantine table, with counts in upload_audit.
+    Column profiles of the loaded rows are kept in table_profiles for the
+    question-answering agent.
+    Pass chunks to load DataFrames already parsed elsewhere (see
+    services.batch_uploader) instead of reading file_path. Uploads to the same
+    ERP are serialized with an advisory lock. progress, if given, is called as
+    progress(phase, rows_copied) as the upload moves through its phases.
     """
+    report = progress or (lambda phase, rows: None)
 
     # -------- 1. Basic validations --------
     if not os.path.exists(file_path):
@@ -29,195 +241,205 @@ def upload_erp_data(user_id: str, erp_name: str, file_path: str):
     erp_name_s = sanitize_name(erp_name)
     table_name = f"{erp_name_s}"
 
-    # -------- 2. Load file into DataFrame --------
-    if file_path.lower().endswith(".csv"):
-        df = pd.read_csv(file_path)
-    elif file_path.lower().endswith((".xls", ".xlsx")):
-        df = pd.read_excel(file_path)
-    else:
-        raise ValueError("Only CSV, XLS, XLSX files are supported.")
+    # -------- 2. File hash (normally computed while the upload was written) --------
+    if file_hash is None:
+        file_hash = file_sha256(file_path)
 
-    if df.empty:
-        raise ValueError("Uploaded file is empty.")
+    # -------- 3. Provision user database and audit table (once per process) --------
+    dbname = ensure_tenant(user_id_s)
 
-    # -------- 3. Create user database if needed --------
-    dbname = create_user_database(user_id_s)
+    # -------- 4. Borrow a pooled connection --------
+    with app_connection(dbname) as conn, erp_write_lock(conn, erp_name_s):
+        cur = conn.cursor()
+        totals = {}
 
-    # -------- 4. Ensure audit table exists --------
-    ensure_audit_table(dbname)
+        try:
+            # -------- 5. Skip re-uploads before parsing anything --------
+            last_audit = last_upload_for_erp(conn, erp_name_s)
+            if last_audit and last_audit["file_hash"] == file_hash:
+                print(f"No changes since last upload for '{last_audit['table_name']}'. Skipping insert.")
+                report("skipped", 0)
+                return
+            report("reading", 0)
 
-    # -------- 5. Connect to DB --------
-    conn = app_connect(dbname)
-    cur = conn.cursor()
+            # -------- 6. Open file as a stream of DataFrame chunks --------
+            if chunks is None:
+                chunks = parsed_chunks(file_path, file_hash)
+            first, chunks, specs = _read_first_chunks(file_path, chunks)
 
-    try:
-        # -------- 6. Check table existence and schema changes --------
-        if table_exists(conn, table_name):
-            existing_cols = get_table_columns(conn, table_name)
-            new_cols = list(df.columns)
-
-            if existing_cols != new_cols:
-                print(f"Schema change detected for table '{table_name}'. Creating new version.")
-                table_name = find_available_table_name(conn, table_name)
-
-        # -------- 7. Create table if not exists --------
-        if not table_exists(conn, table_name):
-            col_defs = [
-                sql.SQL("{} {}").format(
-                    sql.Identifier(c),
-                    sql.SQL(pg_type_from_pd(df[c].dtype))
-                )
-                for c in df.columns
-            ]
-            create_stmt = sql.SQL("CREATE TABLE {} ({})").format(
-                sql.Identifier(table_name),
-                sql.SQL(", ").join(col_defs)
+            # -------- 7-9. Create or version the table and load it chunk by chunk --------
+            table_name = _load_table(
+                conn, cur, dbname, erp_name_s, table_name, file_hash, first, chunks, specs, totals, report,
             )
-            cur.execute(create_stmt)
+
+            # -------- 10. Log success in audit and drop the checkpoint --------
+            report("finishing", totals["rows_copied"])
+            insert_success_audit(cur, user_id_s, erp_name_s, table_name, file_hash, totals)
+            clear_checkpoint(cur, erp_name_s, file_hash)
             conn.commit()
+            if totals["rows_rejected"]:
+                invalidate_catalog(dbname)
+            report("done", totals["rows_copied"])
 
-        # -------- 8. File hash check --------
-        file_hash = file_sha256(file_path)
-        last_audit = last_upload_for_table(conn, table_name)
-        if last_audit and last_audit["file_hash"] == file_hash:
-            print(f"No changes since last upload for '{table_name}'. Skipping insert.")
-            return
+            print(
+                f"Upload complete: {totals['rows_read']} rows read into '{table_name}', "
+                f"{totals['rows_new']} new, {totals['rows_existing']} already present, "
+                f"{totals['rows_rejected']} rejected."
+            )
 
-        # -------- 9. Insert data --------
-        buf = df_to_csv_buffer(df)
-        cur.copy_expert(
-            sql.SQL("COPY {} FROM STDIN WITH CSV HEADER").format(sql.Identifier(table_name)),
-            buf
-        )
-        conn.commit()
+        except Exception as e:
+            conn.rollback()
+            # Another process may have changed the schema under our snapshot
+            invalidate_catalog(dbname)
+            # Log failure in audit
+            insert_failure_audit(conn, cur, user_id_s, erp_name_s, totals.get("table_name", table_name),
+                                 totals.get("rows_read", 0), str(e))
+            traceback.print_exc()
+            raise
+        finally:
+            cur.close()
 
-        # -------- 10. Log success in audit --------
-        cur.execute(
-            """
-            INSERT INTO upload_audit (user_id, erp_name, table_name, file_hash, rows, action, status)
-            VALUES (%s, %s, %s, %s, %s, 'upload', 'success')
-            """,
-            (user_id_s, erp_name_s, table_name, file_hash, len(df)),
-        )
-        cur.execute(
-            sql.SQL("""
-                DO $$
-                DECLARE
-                    tbl_name   TEXT := {tbl};
-                    col_list   TEXT;
-                    sql_query  TEXT;
-                BEGIN
-                    SELECT string_agg(quote_ident(column_name) || ' IS NULL', ' OR ')
-                    INTO col_list
-                    FROM information_schema.columns
-                    WHERE table_name = tbl_name
-                    AND table_schema = 'public';
-
-                    IF col_list IS NOT NULL THEN
-                        sql_query := format('DELETE FROM %I WHERE %s', tbl_name, col_list);
-                        EXECUTE sql_query;
-                    END IF;
-                END $$;
-            """).format(
-                tbl=sql.Literal(erp_name_s)  
+
+def _sheet_table_name(erp_name_s: str, sheet) -> str:
+    """Base table of a workbook sheet: <erp>__<sheet>.
+
+    The double underscore keeps sheet tables apart from the ERP's own table
+    versions (<erp>_1, <erp>_2, ...); the sheet part never starts or ends with
+    an underscore, so the separator stays unambiguous.
+    """
+    try:
+        name = sanitize_name(str(sheet)).strip("_")
+    except ValueError:
+        name = ""
+    if not name:
+        raise ValueError(f"Sheet '{sheet}' has no letters or digits to name its table; rename the sheet.")
+    return f"{erp_name_s}__{name}"
+
+def _sheet_tables(erp_name_s: str, sheets) -> dict:
+    """{sheet: base table} for a workbook; raises ValueError when two sheets map to one table."""
+    tables = {}
+    sheet_of_table = {}
+    for sheet in sheets:
+        table_name = _sheet_table_name(erp_name_s, sheet)
+        if table_name in sheet_of_table:
+            raise ValueError(
+                f"Sheets '{sheet_of_table[table_name]}' and '{sheet}' both map to table '{table_name}'; "
+                "rename one of them."
             )
-        )
-        conn.commit()
-        cur.execute(sql.SQL("""
-                    DO $$
-                    DECLARE
-                        col_list TEXT;
-                        tbl_name TEXT := {tbl};
-                    BEGIN
-                        SELECT string_agg(quote_ident(column_name), ', ')
-                        INTO col_list
-                        FROM information_schema.columns
-                        WHERE table_name = tbl_name
-                        AND column_name <> 'ctid';
-
-                        IF col_list IS NOT NULL THEN
-                            EXECUTE format(
-                                'DELETE FROM %I WHERE ctid NOT IN (SELECT MIN(ctid) FROM %I GROUP BY %s)',
-                                tbl_name, tbl_name, col_list
-                            );
-                        END IF;
-                    END$$;
-                """).format(
-                    tbl=sql.Literal(erp_name_s)
-                ))
+        sheet_of_table[table_name] = sheet
+        tables[sheet] = table_name
+    return tables
 
+def upload_erp_sheets(user_id: str, erp_name: str, file_path: str, sheets, sheet_chunks, file_hash: str = None,
+                      progress=None) -> list:
+    """
+    Upload every sheet of an Excel workbook, each as its own table named
+    <erp_name>__<sheet name>, versioned on schema change like upload_erp_data.
+    sheets lists the sheet names in workbook order and sheet_chunks(sheet)
+    returns a sheet's DataFrame chunks; it is only called after the re-upload
+    check (see services.batch_uploader.upload_erp_workbook, which parses the
+    sheets in parallel). Sheet names are checked before anything is loaded.
+    All sheets load in one transaction, so the workbook is applied entirely or
+    not at all, and each sheet gets its own audit row. Empty sheets are
+    skipped. Returns [(sheet, table_name, totals)] for the sheets loaded, or []
+    when the workbook is the ERP's last upload again.
+    """
+    report = progress or (lambda phase, rows: None)
 
-        conn.commit()
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File '{file_path}' not found.")
 
-        print(f"Upload complete: {len(df)} rows inserted into '{table_name}'.")
+    file_size = os.path.getsize(file_path)
+    if file_size > MAX_UPLOAD_BYTES:
+        raise ValueError(f"File too large: {file_size} bytes (max {MAX_UPLOAD_BYTES} bytes).")
+
+    user_id_s = sanitize_name(user_id)
+    erp_name_s = sanitize_name(erp_name)
+    table_name = f"{erp_name_s}"
+    sheet_tables = _sheet_tables(erp_name_s, sheets)
+
+    if file_hash is None:
+        file_hash = file_sha256(file_path)
+
+    dbname = ensure_tenant(user_id_s)
+
+    with app_connection(dbname) as conn, erp_write_lock(conn, erp_name_s):
+        cur = conn.cursor()
+        totals = {}
+        loaded = []
 
-    except Exception as e:
-        conn.rollback()
-        # Log failure in audit
         try:
-            cur.execute(
-                """
-                INSERT INTO upload_audit (user_id, erp_name, table_name, file_hash, rows, action, status, error)
-                VALUES (%s, %s, %s, %s, %s, 'upload', 'failure', %s)
-                """,
-                (user_id_s, erp_name_s, table_name, None, len(df) if not df.empty else 0, str(e)),
-            )
-            cur.execute(
-                sql.SQL("""
-                    DO $$
-                    DECLARE
-                        tbl_name   TEXT := {tbl};
-                        col_list   TEXT;
-                        sql_query  TEXT;
-                    BEGIN
-                        SELECT string_agg(quote_ident(column_name) || ' IS NULL', ' OR ')
-                        INTO col_list
-                        FROM information_schema.columns
-                        WHERE table_name = tbl_name
-                        AND table_schema = 'public';
-
-                        IF col_list IS NOT NULL THEN
-                            sql_query := format('DELETE FROM %I WHERE %s', tbl_name, col_list);
-                            EXECUTE sql_query;
-                        END IF;
-                    END $$;
-                """).format(
-                    tbl=sql.Literal(erp_name_s + "_data")  
+            last_audit = last_upload_for_erp(conn, erp_name_s)
+            if last_audit and last_audit["file_hash"] == file_hash:
+                print(f"No changes since last upload for '{erp_name_s}'. Skipping insert.")
+                report("skipped", 0)
+                return []
+            report("reading", 0)
+
+            # Final (possibly versioned) table of each sheet loaded so far
+            sheet_of_table = {}
+            for sheet in sheets:
+                table_name = sheet_tables[sheet]
+                chunks = iter(sheet_chunks(sheet))
+                first = next(chunks, None)
+                if first is None or first.empty:
+                    print(f"Sheet '{sheet}' is empty. Skipping.")
+                    continue
+                first, chunks, specs = _read_first_chunks(file_path, itertools.chain([first], chunks))
+
+                # Progress counts rows across all sheets loaded so far
+                done = sum(t["rows_copied"] for _, _, t in loaded)
+                sheet_report = lambda phase, rows, done=done: report(phase, done + rows)
+
+                totals = {}
+                table_name = _load_table(
+                    conn, cur, dbname, erp_name_s, table_name, file_hash, first, chunks, specs, totals,
+                    sheet_report, atomic=True,
                 )
-            )
-            conn.commit()
-            cur.execute(sql.SQL("""
-                        DO $$
-                        DECLARE
-                            col_list TEXT;
-                            tbl_name TEXT := {tbl};
-                        BEGIN
-                            SELECT string_agg(quote_ident(column_name), ', ')
-                            INTO col_list
-                            FROM information_schema.columns
-                            WHERE table_name = tbl_name
-                            AND column_name <> 'ctid';
-
-                            IF col_list IS NOT NULL THEN
-                                EXECUTE format(
-                                    'DELETE FROM %I WHERE ctid NOT IN (SELECT MIN(ctid) FROM %I GROUP BY %s)',
-                                    tbl_name, tbl_name, col_list
-                                );
-                            END IF;
-                        END$$;
-                    """).format(
-                        tbl=sql.Literal(erp_name_s + "_data")
-                    ))
+                # A versioned name (<erp>__<sheet>_1) can equal another sheet's base name
+                if table_name in sheet_of_table:
+                    raise ValueError(
+                        f"Sheets '{sheet_of_table[table_name]}' and '{sheet}' both load into table "
+                        f"'{table_name}'; rename one of them."
+                    )
+                prior = last_sheet_upload(conn, table_name)
+                if prior and (
+                    prior["erp_name"] != erp_name_s
+                    or prior["sheet_name"] is None
+                    or _sheet_table_name(erp_name_s, prior["sheet_name"]) != sheet_tables[sheet]
+                ):
+                    raise ValueError(
+                        f"Table '{table_name}' already holds sheet '{prior['sheet_name']}' of ERP "
+                        f"'{prior['erp_name']}'; rename sheet '{sheet}'."
+                    )
+                sheet_of_table[table_name] = sheet
+                loaded.append((sheet, table_name, totals))
 
+            if not loaded:
+                raise ValueError("Uploaded workbook is empty.")
 
+            rows_copied = sum(t["rows_copied"] for _, _, t in loaded)
+            report("finishing", rows_copied)
+            for sheet, sheet_table, sheet_totals in loaded:
+                insert_success_audit(cur, user_id_s, erp_name_s, sheet_table, file_hash, sheet_totals,
+                                     sheet_name=sheet)
             conn.commit()
+            invalidate_catalog(dbname)
+            report("done", rows_copied)
 
+            for sheet, sheet_table, t in loaded:
+                print(
+                    f"Sheet '{sheet}': {t['rows_read']} rows read into '{sheet_table}', "
+                    f"{t['rows_new']} new, {t['rows_existing']} already present, {t['rows_rejected']} rejected."
+                )
+            return loaded
 
-            conn.commit()
-        except Exception:
+        except Exception as e:
             conn.rollback()
-        traceback.print_exc()
-        raise
-    finally:
-        cur.close()
-        conn.close()
+            invalidate_catalog(dbname)
+            insert_failure_audit(conn, cur, user_id_s, erp_name_s, totals.get("table_name", table_name),
+                                 totals.get("rows_read", 0), str(e))
+            traceback.print_exc()
+            raise
+        finally:
+            cur.close()
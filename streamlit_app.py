@@ -1,9 +1,5 @@
 import sys, os
 sys.dont_write_bytecode = True
-from langchain_openai import ChatOpenAI
-from langchain_community.utilities import SQLDatabase
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
-from langgraph.prebuilt import create_react_agent
 import time
 import psycopg2
 from dotenv import load_dotenv
@@ -12,15 +8,22 @@ import tempfile
 import traceback
 
 # Import your uploader function directly
-from services.uploader import upload_erp_data  
+from services.batch_uploader import upload_erp_files
 # Import your delete function
 from services.delete import delete_erp  
+from services.sql_agent import answer_question, get_database
+from utils.file_utils import copy_and_hash
+from utils.readers import upload_extension
 
 
 load_dotenv()
 
 
-ALLOWED_EXTENSIONS = {".csv", ".xls", ".xlsx"}
+ALLOWED_EXTENSIONS = {
+    ".csv", ".xls", ".xlsx",
+    ".csv.gz", ".xls.gz", ".xlsx.gz", ".csv.bz2", ".xls.bz2", ".xlsx.bz2", ".zip",
+    ".parquet", ".arrow", ".feather", ".ipc",
+}
 
 # Sidebar upload section
 with st.sidebar:
@@ -32,11 +35,15 @@ with st.sidebar:
 
     # File uploader
     uploaded_files = st.file_uploader(
-        "Upload CSV/XLS/XLSX files",
-        type=["csv", "xls", "xlsx"],
+        "Upload CSV/XLS/XLSX files (or .gz/.bz2/.zip archives of them), Parquet or Arrow",
+        type=["csv", "xls", "xlsx", "gz", "bz2", "zip", "parquet", "arrow", "feather", "ipc"],
         accept_multiple_files=True,
         key="sidebar_file_uploader"
     )
+    workbook_mode = st.checkbox(
+        "Load every sheet of Excel workbooks as its own table",
+        key="sidebar_workbook_mode"
+    )
 
     if st.button("Upload Files", key="sidebar_upload_btn"):
         if not user_id or not erp_name:
@@ -45,41 +52,30 @@ with st.sidebar:
             st.error("⚠️ Please upload at least one file.")
         else:
             results = []
+            saved = []  # (index in results, (file_name, tmp_path, file_hash))
             for file in uploaded_files:
-                ext = os.path.splitext(file.name)[1].lower()
+                ext = upload_extension(file.name)
                 if ext not in ALLOWED_EXTENSIONS:
                     results.append({
                         "file_name": file.name,
                         "status": "error",
-                        "message": f"Invalid file type '{ext}'. Only CSV, XLS, XLSX are allowed."
+                        "message": f"Invalid file type '{ext}'. Only CSV, XLS, XLSX (optionally .gz, .bz2 or .zip compressed), Parquet and Arrow are allowed."
                     })
                     continue
 
-                try:
-                    # Save file temporarily
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-                        tmp.write(file.read())
-                        tmp_path = tmp.name
-
-                    # Call the ERP uploader logic directly
-                    upload_erp_data(user_id, erp_name, tmp_path)
-
-                    results.append({
-                        "file_name": file.name,
-                        "status": "success",
-                        "message": "ERP data uploaded successfully"
-                    })
-
-                except Exception as exc:
-                    error_trace = traceback.format_exc()
-                    results.append({
-                        "file_name": file.name,
-                        "status": "error",
-                        "message": str(exc),
-                        "traceback": error_trace
-                    })
+                # Save file temporarily, hashing it in the same pass
+                with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
+                    file_hash = copy_and_hash(file, tmp)
+                saved.append((len(results), (file.name, tmp.name, file_hash)))
+                results.append(None)
 
-                finally:
+            try:
+                # Parse all files in parallel, then load them in upload order
+                batch_results = upload_erp_files(user_id, erp_name, [f for _, f in saved], workbook=workbook_mode)
+                for (i, _), result in zip(saved, batch_results):
+                    results[i] = result
+            finally:
+                for _, (_, tmp_path, _) in saved:
                     if os.path.exists(tmp_path):
                         os.remove(tmp_path)
 
@@ -379,9 +375,7 @@ with st.sidebar:
     # Test connection button
     if st.button("Test Database Connection", use_container_width=True):
         try:
-            test_uri = f"postgresql+psycopg2://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-            test_db = SQLDatabase.from_uri(test_uri)
-            tables = test_db.get_usable_table_names()
+            tables = get_database(db_name, api_key).get_usable_table_names()
             
             with st.spinner("Testing connection..."):
                 time.sleep(1)
@@ -433,74 +427,9 @@ if submit_button and user_question.strip():
     # Show loading indicator
     with st.spinner("Analyzing your question and generating response..."):
         try:
-            # Construct the database URI
-            db_uri = f"postgresql+psycopg2://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-            
-            # Initialize SQLDatabase connection
-            db = SQLDatabase.from_uri(db_uri)
-            
-            # Initialize the LLM
-            llm = ChatOpenAI(
-                model="openai/gpt-4.1-mini",
-                temperature=0,
-                openai_api_key=api_key,
-                openai_api_base="https://openrouter.ai/api/v1"
-            )
-            
-            # Create toolkit and agent
-            toolkit = SQLDatabaseToolkit(db=db, llm=llm)
-            tools = toolkit.get_tools()
-            
-            # System prompt
-            system_prompt = """
-            You are an agent designed to interact with a PostgreSQL database.
-            IMPORTANT: This database uses case-sensitive column names that MUST be quoted with double quotes.
-            For example, use "Discount_Band" instead of Discount_Band.
-            Given an input question, create a syntactically correct {dialect} query to run,
-            then look at the results of the query and return the answer. Unless the user
-            specifies a specific number of examples they wish to obtain, always limit your
-            query to at most {top_k} results.
-
-            You can order the results by a relevant column to return the most interesting
-            examples in the database. Never query for all the columns from a specific table,
-            only ask for the relevant columns given the question.
-
-            You MUST double check your query before executing it. If you get an error while
-            executing a query, rewrite the query and try again.
-
-            DO NOT make any DML statements (INSERT, UPDATE, DELETE, DROP etc.) to the
-            database.
-
-            To start you should ALWAYS look at the tables in the database to see what you
-            can query. Do NOT skip this step.
-
-            Then you should query the schema of the most relevant tables.
-            """.format(
-                dialect=db.dialect,
-                top_k=5,
-            )
-            
-            # Create agent
-            agent = create_react_agent(
-                llm,
-                tools,
-                prompt=system_prompt,
-            )
-            
-            # Stream the agent response and capture only the final AI message
-            final_response = ""
-            for step in agent.stream(
-                {"messages": [{"role": "user", "content": user_question}]},
-                stream_mode="values",
-            ):
-                # Get the last message in the step
-                if "messages" in step and len(step["messages"]) > 0:
-                    latest_message = step["messages"][-1]
-                    
-                    # Check if it's an AI message and store it
-                    if hasattr(latest_message, 'type') and latest_message.type == "ai":
-                        final_response = latest_message.content
-            
+            # Warm database metadata, LLM client and agent are reused across questions
+            final_response = answer_question(db_name, user_question, api_key)
+
             # Store and display only the final response
             st.session_state.query_results = final_response
             st.session_state.messages.append({
@@ -2,7 +2,7 @@ import re
 import hashlib
 import io
 import pandas as pd
-from config.settings import ALLOWED_NAME_RE
+from config.settings import ALLOWED_NAME_RE, COPY_SERIALIZE_ROWS
 
 def sanitize_name(name: str) -> str:
     """Sanitize user-provided name into allowed lowercase identifier (a-z0-9_)."""
@@ -21,8 +21,92 @@ def file_sha256(path: str) -> str:
             h.update(chunk)
     return h.hexdigest()
 
-def df_to_csv_buffer(df: pd.DataFrame) -> io.StringIO:
-    buf = io.StringIO()
-    df.to_csv(buf, index=False)
-    buf.seek(0)
-    return buf
+def copy_and_hash(src, dst, chunk_size: int = 1024 * 1024) -> str:
+    """Copy binary file object src into dst, returning the SHA-256 of the bytes copied.
+
+    Lets the front ends hash an upload in the same pass that writes it to disk,
+    so upload_erp_data never has to re-read the file just to dedupe it.
+    """
+    h = hashlib.sha256()
+    for chunk in iter(lambda: src.read(chunk_size), b""):
+        h.update(chunk)
+        dst.write(chunk)
+    return h.hexdigest()
+
+def df_to_csv_buffer(df: pd.DataFrame) -> "CsvChunkStream":
+    """Readable CSV (with header) for copy_expert, serialized lazily as COPY reads it."""
+    return CsvChunkStream([df])
+
+def iter_row_slices(chunks, rows: int):
+    """Split each DataFrame in chunks into consecutive slices of at most `rows` rows."""
+    for chunk in chunks:
+        if len(chunk) <= rows:
+            yield chunk
+            continue
+        for start in range(0, len(chunk), rows):
+            yield chunk.iloc[start:start + rows]
+
+class ChunkStream(io.IOBase):
+    """Readable stream over an iterable of DataFrame chunks, for copy_expert.
+
+    Rows are serialized only as COPY calls read(size), slice_rows at a time, so
+    the serialized form in memory is bounded by the slice size rather than the
+    chunk or dataset size. `rows` counts the rows handed out so far.
+    Subclasses implement _serialize.
+    """
+
+    empty = ""
+
+    def __init__(self, chunks, slice_rows: int = COPY_SERIALIZE_ROWS):
+        self._chunks = iter_row_slices(chunks, slice_rows)
+        self._buf = self.empty
+        self._pos = 0
+        self._done = False
+        self.rows = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def _serialize(self, chunk):
+        raise NotImplementedError
+
+    def _trailer(self):
+        return self.empty
+
+    def _fill(self) -> bool:
+        if self._done:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._done = True
+            self._buf = self._trailer()
+        else:
+            self._buf = self._serialize(chunk)
+            self.rows += len(chunk)
+        self._pos = 0
+        return True
+
+    def read(self, size: int = -1):
+        parts = []
+        while size != 0:
+            if self._pos >= len(self._buf) and not self._fill():
+                break
+            end = len(self._buf) if size < 0 else min(len(self._buf), self._pos + size)
+            parts.append(self._buf[self._pos:end])
+            if size > 0:
+                size -= end - self._pos
+            self._pos = end
+        return self.empty.join(parts)
+
+
+class CsvChunkStream(ChunkStream):
+    """CSV text (header on the first chunk only) for COPY ... WITH CSV HEADER."""
+
+    def __init__(self, chunks, header: bool = True, slice_rows: int = COPY_SERIALIZE_ROWS):
+        super().__init__(chunks, slice_rows)
+        self._header = header
+
+    def _serialize(self, chunk) -> str:
+        text = chunk.to_csv(index=False, header=self._header)
+        self._header = False
+        return text
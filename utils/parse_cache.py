@@ -0,0 +1,126 @@
+import os
+import time
+import uuid
+import shutil
+import threading
+import pandas as pd
+from config.settings import PARSE_CACHE_DIR, PARSE_CACHE_MAX_BYTES, CSV_PARSER, CSV_CHUNK_ROWS
+from utils.readers import iter_file_chunks, ARROW_EXTENSIONS
+
+# Entries younger than this are never evicted, so a reader is not pulled out from under
+_EVICT_GRACE_SECS = 60
+_evict_lock = threading.Lock()
+
+
+def _entry_dir(file_hash: str) -> str:
+    # Chunk boundaries and dtypes depend on the parser settings, so they are part of the key
+    return os.path.join(PARSE_CACHE_DIR, f"{file_hash}-{CSV_PARSER}-{CSV_CHUNK_ROWS}")
+
+
+def cache_enabled() -> bool:
+    return PARSE_CACHE_MAX_BYTES > 0
+
+
+def has_parsed(file_hash: str) -> bool:
+    return cache_enabled() and os.path.isdir(_entry_dir(file_hash))
+
+
+def _to_arrow(chunk: pd.DataFrame):
+    """Arrow table for a chunk.
+
+    Object columns Arrow cannot store (mixed str/int/datetime cells, as Excel
+    produces) are cast to text, which is how the uploader treats them anyway.
+    """
+    import pyarrow as pa
+
+    try:
+        return pa.Table.from_pandas(chunk, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    chunk = chunk.copy()
+    for c in chunk.columns:
+        if pd.api.types.is_object_dtype(chunk[c].dtype):
+            try:
+                pa.array(chunk[c], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                chunk[c] = chunk[c].where(chunk[c].isna(), chunk[c].astype(str))
+    return pa.Table.from_pandas(chunk, preserve_index=False)
+
+
+def iter_cached_chunks(file_hash: str):
+    """Yield the cached chunks of a file, in order, with the dtypes they were parsed with."""
+    import pyarrow.parquet as pq
+
+    entry = _entry_dir(file_hash)
+    for name in sorted(os.listdir(entry)):
+        os.utime(entry)  # mark as recently used, and keep it past eviction's grace period while loading
+        yield pq.read_table(os.path.join(entry, name), memory_map=True).to_pandas()
+
+
+def cache_chunks(file_hash: str, chunks):
+    """Pass chunks through while writing each to a Parquet part.
+
+    The entry is published only once the whole file has been read, so a failed
+    or abandoned parse never leaves a partial entry.
+    """
+    import pyarrow.parquet as pq
+
+    os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+    tmp = os.path.join(PARSE_CACHE_DIR, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp)
+    try:
+        for i, chunk in enumerate(chunks):
+            pq.write_table(_to_arrow(chunk), os.path.join(tmp, f"part-{i:06d}.parquet"))
+            yield chunk
+        try:
+            os.rename(tmp, _entry_dir(file_hash))
+        except OSError:
+            # Another upload of the same file published it first
+            return
+        evict()
+    finally:
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def cacheable(file_path: str) -> bool:
+    # Parquet/Arrow uploads are already columnar and are read directly
+    return cache_enabled() and not file_path.lower().endswith(ARROW_EXTENSIONS)
+
+
+def parsed_chunks(file_path: str, file_hash: str):
+    """Chunks of an uploaded file from the cache, or parsed now while filling the cache."""
+    if not cacheable(file_path):
+        return iter_file_chunks(file_path)
+    if has_parsed(file_hash):
+        return iter_cached_chunks(file_hash)
+    return cache_chunks(file_hash, iter_file_chunks(file_path))
+
+
+def warm_cache(file_path: str, file_hash: str):
+    """Parse file_path into the cache unless it is already there (run in parse worker processes)."""
+    for _ in parsed_chunks(file_path, file_hash):
+        pass
+
+
+def _size(path: str) -> int:
+    return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+
+
+def evict(max_bytes: int = PARSE_CACHE_MAX_BYTES):
+    """Remove least recently used entries until the cache fits in max_bytes."""
+    with _evict_lock:
+        entries = [
+            (os.stat(e.path).st_mtime, _size(e.path), e.path)
+            for e in os.scandir(PARSE_CACHE_DIR)
+            if e.is_dir() and not e.name.startswith(".tmp-")
+        ]
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        for mtime, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if now - mtime < _EVICT_GRACE_SECS:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
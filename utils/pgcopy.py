@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+from config.settings import COPY_SERIALIZE_ROWS
+from utils.file_utils import ChunkStream
+from utils.type_inference import numeric_scale
+
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + b"\x00\x00\x00\x00" + b"\x00\x00\x00\x00"
+PGCOPY_TRAILER = b"\xff\xff"
+
+# Postgres epoch is 2000-01-01 UTC
+_PG_EPOCH_US = 946_684_800 * 1_000_000
+_PG_EPOCH_DAYS = 10_957
+
+_INT_TYPES = {"smallint": ">i2", "integer": ">i4", "bigint": ">i8"}
+_FLOAT_TYPES = {"real": ">f4", "double precision": ">f8"}
+_NUMERIC_NEG = 0x4000
+_NBASE = 10_000
+_TYPE_ALIASES = {
+    "timestamp with time zone": "timestamptz",
+    "int2": "smallint",
+    "int4": "integer",
+    "int8": "bigint",
+    "float8": "double precision",
+    "float4": "real",
+    "bool": "boolean",
+}
+SUPPORTED_TYPES = set(_INT_TYPES) | set(_FLOAT_TYPES) | {"boolean", "timestamptz", "date", "text"}
+
+
+def normalize_pg_type(pg_type: str) -> str:
+    t = pg_type.strip().lower()
+    return _TYPE_ALIASES.get(t, t)
+
+
+def binary_copy_supported(pg_types: dict, df: pd.DataFrame, naive_timestamps_ok: bool = True) -> bool:
+    """True when every column of df can be encoded for its target Postgres type.
+
+    Naive datetimes are encoded as UTC. Pass naive_timestamps_ok=False when the
+    server's TimeZone is something else, because the CSV path would interpret
+    them in that zone.
+    """
+    for c, pg_type in pg_types.items():
+        t = normalize_pg_type(pg_type)
+        dtype = df[c].dtype
+        scale = numeric_scale(t)
+        if scale is not None:
+            # Integers (uint64 past 2**53) and Decimals go as exact text on the CSV path
+            if not pd.api.types.is_float_dtype(dtype):
+                return False
+            # As do values whose scaled digits do not fit the int64 the encoder works in
+            vals = np.abs(df[c].to_numpy(dtype="float64", na_value=np.nan))
+            if len(vals) and np.nanmax(vals, initial=0) * 10 ** (4 * -(-scale // 4)) >= 2 ** 63:
+                return False
+            continue
+        if t not in SUPPORTED_TYPES:
+            return False
+        if t in _INT_TYPES and not pd.api.types.is_integer_dtype(dtype):
+            return False
+        if t in _FLOAT_TYPES and (
+            not pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)
+        ):
+            return False
+        if t == "boolean" and not pd.api.types.is_bool_dtype(dtype):
+            return False
+        if t in ("timestamptz", "date"):
+            if not pd.api.types.is_datetime64_any_dtype(dtype):
+                return False
+            if t == "timestamptz" and getattr(dtype, "tz", None) is None and not naive_timestamps_ok:
+                return False
+    return True
+
+
+def _numeric_values(s: pd.Series, scale: int):
+    """Encode numeric(p,s) as fixed-width base-10000 digit groups, sized for the largest value."""
+    vals = s.astype("float64").to_numpy()
+    mask = np.isnan(vals)
+    units = np.round(np.where(mask, 0, vals) * 10 ** scale)
+    frac_groups = -(-scale // 4)
+    factor = 10 ** (4 * frac_groups - scale)
+    if len(units) and np.abs(units).max() * factor >= 2 ** 63:
+        raise ValueError(f"Column '{s.name}' has values out of range for numeric.")
+    mags = np.abs(units).astype(np.uint64) * np.uint64(factor)
+    groups = frac_groups + 1
+    top = int(mags.max()) if len(mags) else 0
+    while top >= _NBASE ** groups:
+        groups += 1
+    header = [
+        np.full(len(vals), groups, dtype=">i2"),
+        np.full(len(vals), groups - frac_groups - 1, dtype=">i2"),
+        np.where(units < 0, _NUMERIC_NEG, 0).astype(">u2"),
+        np.full(len(vals), scale, dtype=">i2"),
+    ]
+    digits = [
+        ((mags // np.uint64(_NBASE ** (groups - 1 - g))) % np.uint64(_NBASE)).astype(">i2")
+        for g in range(groups)
+    ]
+    cols = [a.view(np.uint8).reshape(-1, 2) for a in header + digits]
+    return np.hstack(cols), mask
+
+
+def _fixed_values(s: pd.Series, t: str):
+    """Return (n x width uint8 matrix of wire values, null mask) for a fixed-width type."""
+    n = len(s)
+    scale = numeric_scale(t)
+    if scale is not None:
+        return _numeric_values(s, scale)
+    if t in _INT_TYPES:
+        s = s.astype("Int64")
+        mask = s.isna().to_numpy()
+        vals = s.to_numpy(dtype="int64", na_value=0)
+        info = np.iinfo(_INT_TYPES[t].replace(">", ""))
+        if len(vals) and (vals.min() < info.min or vals.max() > info.max):
+            raise ValueError(f"Column '{s.name}' has values out of range for {t}.")
+        vals = vals.astype(_INT_TYPES[t])
+    elif t in _FLOAT_TYPES:
+        vals = s.astype("float64").to_numpy()
+        mask = np.isnan(vals)
+        vals = vals.astype(_FLOAT_TYPES[t])
+    elif t == "boolean":
+        s = s.astype("boolean")
+        mask = s.isna().to_numpy()
+        vals = s.to_numpy(dtype=bool, na_value=False).astype("?")
+    else:
+        # timestamptz / date
+        if not pd.api.types.is_datetime64_any_dtype(s.dtype):
+            s = pd.to_datetime(s)
+        if getattr(s.dtype, "tz", None) is not None:
+            s = s.dt.tz_convert("UTC").dt.tz_localize(None)
+        mask = s.isna().to_numpy()
+        if t == "date":
+            days = s.to_numpy(dtype="datetime64[D]").astype("int64") - _PG_EPOCH_DAYS
+            vals = np.where(mask, 0, days).astype(">i4")
+        else:
+            micros = s.to_numpy(dtype="datetime64[us]").astype("int64") - _PG_EPOCH_US
+            vals = np.where(mask, 0, micros).astype(">i8")
+    return vals.view(np.uint8).reshape(n, vals.dtype.itemsize), mask
+
+
+def encode_frame(df: pd.DataFrame, pg_types: dict) -> bytes:
+    """Encode df's rows as PGCOPY binary tuples (no file header or trailer)."""
+    n = len(df)
+    columns = list(pg_types)
+    if n == 0:
+        return b""
+
+    lengths = np.empty((n, len(columns)), dtype=np.int64)
+    encoded = []
+    for j, c in enumerate(columns):
+        t = normalize_pg_type(pg_types[c])
+        s = df[c]
+        if t == "text":
+            strs = s.astype(str)
+            # CSV writes '' unquoted, which COPY reads as NULL; keep both paths identical
+            mask = s.isna().to_numpy() | (strs == "").to_numpy()
+            payload = [v.encode("utf-8") for v in strs[~mask]]
+            lens = np.fromiter((len(b) for b in payload), dtype=np.int64, count=len(payload))
+            lengths[:, j] = -1
+            lengths[~mask, j] = lens
+            encoded.append(("var", mask, np.frombuffer(b"".join(payload), dtype=np.uint8), lens))
+        else:
+            matrix, mask = _fixed_values(s, t)
+            width = matrix.shape[1]
+            lengths[:, j] = np.where(mask, -1, width)
+            encoded.append(("fixed", mask, matrix[~mask], width))
+
+    # Tuple layout: int16 field count, then per field int32 length + payload
+    cell_sizes = 4 + np.maximum(lengths, 0)
+    row_sizes = 2 + cell_sizes.sum(axis=1)
+    row_starts = np.concatenate(([0], np.cumsum(row_sizes)[:-1]))
+    cell_starts = row_starts[:, None] + 2 + np.concatenate(
+        (np.zeros((n, 1), dtype=np.int64), np.cumsum(cell_sizes, axis=1)[:, :-1]), axis=1
+    )
+    out = np.empty(int(row_sizes.sum()), dtype=np.uint8)
+
+    field_count = np.frombuffer(np.array(len(columns), dtype=">i2").tobytes(), dtype=np.uint8)
+    out[row_starts[:, None] + np.arange(2)] = field_count
+    for j, (kind, mask, data, extra) in enumerate(encoded):
+        starts = cell_starts[:, j]
+        out[starts[:, None] + np.arange(4)] = lengths[:, j].astype(">i4").view(np.uint8).reshape(n, 4)
+        payload_starts = starts[~mask] + 4
+        if kind == "fixed":
+            out[payload_starts[:, None] + np.arange(extra)] = data
+        elif len(data):
+            lens = extra
+            offsets = np.concatenate(([0], np.cumsum(lens)[:-1]))
+            out[np.repeat(payload_starts - offsets, lens) + np.arange(len(data))] = data
+    return out.tobytes()
+
+
+class BinaryCopyStream(ChunkStream):
+    """PGCOPY binary stream for COPY ... WITH (FORMAT binary)."""
+
+    empty = b""
+
+    def __init__(self, chunks, pg_types: dict, slice_rows: int = COPY_SERIALIZE_ROWS):
+        super().__init__(chunks, slice_rows)
+        self._pg_types = pg_types
+        self._header = True
+
+    def _serialize(self, chunk) -> bytes:
+        data = encode_frame(chunk, self._pg_types)
+        if self._header:
+            self._header = False
+            data = PGCOPY_HEADER + data
+        return data
+
+    def _trailer(self) -> bytes:
+        return (PGCOPY_HEADER if self._header else b"") + PGCOPY_TRAILER
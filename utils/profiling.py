@@ -0,0 +1,138 @@
+"""
+Column profiles of loaded data, computed per chunk with vectorized pandas ops
+and merged into a running per-table profile.
+
+A column profile is a JSON-able dict:
+    count           values profiled (including nulls)
+    nulls           null values among them
+    min, max        over non-null values (None for types without an order)
+    distinct        distinct non-null values; a lower bound when distinct_exact is False
+    distinct_exact  False once more than _TRACKED_VALUES distinct values were seen
+    top             [[value, count], ...] most frequent values, at most _TRACKED_VALUES
+                    (approximate counts once distinct_exact is False); not kept for
+                    float and timestamp columns, whose values rarely repeat
+"""
+import datetime
+import decimal
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+# Distinct values counted per column; beyond this the least frequent are dropped
+_TRACKED_VALUES = 200
+# Values shown per column in the agent's schema context
+_TOP_VALUES = 5
+
+
+def _json_value(v):
+    if v is None or (not isinstance(v, (list, dict)) and pd.isna(v)):
+        return None
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, (pd.Timestamp, datetime.datetime, datetime.date, datetime.time)):
+        return v.isoformat()
+    if isinstance(v, decimal.Decimal):
+        return float(v)
+    if isinstance(v, (bool, int, float, str)):
+        return v
+    return str(v)
+
+
+def _orderable(s: pd.Series) -> bool:
+    return (
+        pd.api.types.is_numeric_dtype(s.dtype)
+        or pd.api.types.is_datetime64_any_dtype(s.dtype)
+        or pd.api.types.is_string_dtype(s.dtype)
+    ) and not pd.api.types.is_bool_dtype(s.dtype)
+
+
+def profile_column(s: pd.Series) -> dict:
+    nulls = int(s.isna().sum())
+    values = s.dropna()
+    lo = hi = None
+    if len(values) and _orderable(values):
+        try:
+            lo, hi = _json_value(values.min()), _json_value(values.max())
+        except TypeError:
+            # Mixed types in an object column have no order
+            pass
+    profile = {"count": int(len(s)), "nulls": nulls, "min": lo, "max": hi}
+    if pd.api.types.is_float_dtype(s.dtype) or pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return {**profile, "distinct": int(values.nunique()), "distinct_exact": True, "top": None}
+    counts = values.value_counts(sort=True)
+    top = [[_json_value(v), int(n)] for v, n in counts.iloc[:_TRACKED_VALUES].items()]
+    return {**profile, "distinct": int(len(counts)), "distinct_exact": len(counts) <= _TRACKED_VALUES, "top": top}
+
+
+def profile_frame(df: pd.DataFrame) -> dict:
+    """{column: column profile} for one chunk."""
+    return {str(c): profile_column(df[c]) for c in df.columns}
+
+
+def _pick(a, b, better):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    try:
+        return better(a, b)
+    except TypeError:
+        return a
+
+
+def merge_column(a: dict, b: dict) -> dict:
+    merged = {
+        "count": a["count"] + b["count"],
+        "nulls": a["nulls"] + b["nulls"],
+        "min": _pick(a["min"], b["min"], min),
+        "max": _pick(a["max"], b["max"], max),
+    }
+    # A side without values adds nothing to the distinct values
+    for x, y in ((a, b), (b, a)):
+        if x["count"] == x["nulls"]:
+            return {**merged, "distinct": y["distinct"], "distinct_exact": y["distinct_exact"], "top": y["top"]}
+    if a["top"] is None or b["top"] is None:
+        # Untracked values cannot be unioned; the larger side is a lower bound
+        return {**merged, "distinct": max(a["distinct"], b["distinct"]), "distinct_exact": False, "top": None}
+    top = Counter()
+    for p in (a, b):
+        for v, n in p["top"]:
+            top[v] += n
+    exact = a["distinct_exact"] and b["distinct_exact"] and len(top) <= _TRACKED_VALUES
+    return {
+        **merged,
+        "distinct": len(top) if exact else max(a["distinct"], b["distinct"], min(len(top), _TRACKED_VALUES)),
+        "distinct_exact": exact,
+        "top": [[v, n] for v, n in top.most_common(_TRACKED_VALUES)],
+    }
+
+
+def merge_profiles(a: dict, b: dict) -> dict:
+    """Merge two {column: profile} dicts; a column in only one of them is kept as is."""
+    merged = dict(a)
+    for c, p in b.items():
+        merged[c] = merge_column(a[c], p) if c in a else p
+    return merged
+
+
+def format_profile(row_count: int, columns: dict) -> str:
+    """Compact text form of a table profile for the model's schema context."""
+    lines = [f"Profile: {row_count} rows"]
+    for c, p in columns.items():
+        parts = []
+        if p["count"]:
+            parts.append(f"nulls {100 * p['nulls'] / p['count']:.1f}%")
+        if p["min"] is not None:
+            parts.append(f"range {p['min']} .. {p['max']}")
+        parts.append(f"{'' if p['distinct_exact'] else '>='}{p['distinct']} distinct")
+        if p["top"]:
+            parts.append("top " + ", ".join(f"{v!r} ({n})" for v, n in p["top"][:_TOP_VALUES]))
+        lines.append(f'"{c}": ' + "; ".join(parts))
+    return "\n".join(lines)
+
+
+def profile_terms(columns: dict) -> str:
+    """Frequent text values of a table, for lexical table ranking."""
+    return " ".join(
+        v for p in columns.values() for v, _ in (p["top"] or [])[:_TOP_VALUES] if isinstance(v, str)
+    )
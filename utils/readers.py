@@ -0,0 +1,374 @@
+import os
+import io
+import bz2
+import csv
+import gzip
+import pickle
+import zipfile
+import tempfile
+import pandas as pd
+from config.settings import CSV_CHUNK_ROWS, CSV_PARSER, ARROW_CSV_BLOCK_BYTES, MAX_DECOMPRESSED_BYTES
+
+DATA_EXTENSIONS = (".csv", ".xlsx", ".xls")
+_COMPRESSED = {".gz": gzip.open, ".bz2": bz2.open}
+
+def upload_extension(file_name: str) -> str:
+    """Lowercased extension including a compression suffix: '.csv', '.csv.gz', '.zip'."""
+    root, ext = os.path.splitext(file_name.lower())
+    if ext in _COMPRESSED:
+        ext = os.path.splitext(root)[1] + ext
+    return ext
+
+class _LimitedReader(io.RawIOBase):
+    """Binary stream over a decompressor that fails once more than `limit` bytes come out.
+
+    Guards against archives that expand far beyond MAX_UPLOAD_BYTES.
+    """
+
+    def __init__(self, raw, limit: int, archive=None):
+        self._raw = raw
+        self._archive = archive
+        self._limit = limit
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = self._raw.readinto(b)
+        self.bytes_read += n or 0
+        if self.bytes_read > self._limit:
+            raise ValueError(f"Decompressed upload exceeds {self._limit} bytes.")
+        return n
+
+    def close(self):
+        self._raw.close()
+        if self._archive is not None:
+            self._archive.close()
+        super().close()
+
+def _open_compressed(file_path: str, limit: int = MAX_DECOMPRESSED_BYTES):
+    """Return (inner data extension, decompressed binary stream) for a .gz/.bz2/.zip upload.
+
+    A .zip must hold exactly one CSV/XLS/XLSX member; nothing is extracted to disk.
+    """
+    lower = file_path.lower()
+    if lower.endswith(".zip"):
+        zf = zipfile.ZipFile(file_path)
+        members = [
+            m for m in zf.infolist()
+            if not m.is_dir() and not m.filename.startswith("__MACOSX/")
+            and os.path.splitext(m.filename.lower())[1] in DATA_EXTENSIONS
+        ]
+        if len(members) != 1:
+            zf.close()
+            raise ValueError("A .zip upload must contain exactly one CSV, XLS or XLSX file.")
+        member = members[0]
+        reader = _LimitedReader(zf.open(member), limit, archive=zf)
+        return os.path.splitext(member.filename.lower())[1], io.BufferedReader(reader)
+    ext = upload_extension(lower)
+    inner, compression = os.path.splitext(ext)
+    if inner not in DATA_EXTENSIONS:
+        raise ValueError(f"Compressed uploads must be named like data.csv{compression}.")
+    return inner, io.BufferedReader(_LimitedReader(_COMPRESSED[compression](file_path, "rb"), limit))
+
+def _iter_compressed_chunks(file_path: str, chunk_rows: int):
+    inner, stream = _open_compressed(file_path)
+    with stream:
+        if inner == ".csv":
+            with pd.read_csv(stream, chunksize=chunk_rows) as reader:
+                yield from reader
+            return
+        # Workbooks need random access; they are zip containers already, so hold them in memory
+        data = io.BytesIO(stream.read())
+    if inner == ".xlsx":
+        yield from iter_xlsx_chunks(data, chunk_rows)
+    else:
+        yield pd.read_excel(data)
+
+ARROW_EXTENSIONS = (".parquet", ".arrow", ".feather", ".ipc")
+
+def _arrow_source(file_path: str, chunk_rows: int = CSV_CHUNK_ROWS):
+    """Open a Parquet or Arrow IPC file memory-mapped; returns (schema, iterator of record batches)."""
+    import pyarrow as pa
+
+    source = pa.memory_map(file_path, "r")
+    if file_path.lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(source, memory_map=True)
+        return pf.schema_arrow, pf.iter_batches(batch_size=chunk_rows)
+    try:
+        reader = pa.ipc.open_file(source)
+        return reader.schema, (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        # Arrow IPC stream format (no footer)
+        source.seek(0)
+        reader = pa.ipc.open_stream(source)
+        return reader.schema, iter(reader)
+
+def _arrow_to_pandas(table):
+    """Convert to pandas with nullable dtypes, so integer and boolean columns keep their type across nulls."""
+    import pyarrow as pa
+
+    mapping = {
+        pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(), pa.int32(): pd.Int32Dtype(),
+        pa.int64(): pd.Int64Dtype(), pa.uint8(): pd.UInt8Dtype(), pa.uint16(): pd.UInt16Dtype(),
+        pa.uint32(): pd.UInt32Dtype(), pa.uint64(): pd.UInt64Dtype(), pa.bool_(): pd.BooleanDtype(),
+    }
+    return table.to_pandas(types_mapper=mapping.get, date_as_object=False)
+
+def iter_arrow_chunks(file_path: str, chunk_rows: int = CSV_CHUNK_ROWS):
+    """Yield a Parquet/Arrow IPC file as DataFrame chunks of about chunk_rows rows.
+
+    Record batches are read from a memory map and converted a chunk at a time,
+    so the whole file is never materialized.
+    """
+    schema, batches = _arrow_source(file_path, chunk_rows)
+    return _rebatch(schema, batches, chunk_rows)
+
+def _rebatch(schema, batches, chunk_rows: int):
+    """Group record batches into DataFrames of at least chunk_rows rows (the last may be smaller)."""
+    import pyarrow as pa
+
+    pending, rows = [], 0
+    for batch in batches:
+        pending.append(batch)
+        rows += batch.num_rows
+        if rows >= chunk_rows:
+            yield _arrow_to_pandas(pa.Table.from_batches(pending, schema))
+            pending, rows = [], 0
+    if pending:
+        yield _arrow_to_pandas(pa.Table.from_batches(pending, schema))
+
+# Read as null by the Arrow parser, matching pandas' default NA strings that ERP exports use
+_CSV_NULL_VALUES = ["", "NA", "N/A", "n/a", "NULL", "null", "NaN", "nan", "#N/A", "-NaN", "None"]
+_SNIFF_BYTES = 64 * 1024
+
+def sniff_csv(file_path: str):
+    """Guess (encoding, delimiter) from the start of a CSV file.
+
+    UTF-8 (with or without BOM) is preferred; Windows ERP exports that are not
+    valid UTF-8 fall back to cp1252, then latin-1.
+    """
+    with open(file_path, "rb") as f:
+        sample = f.read(_SNIFF_BYTES)
+    if len(sample) == _SNIFF_BYTES and b"\n" in sample:
+        # Do not judge the encoding on a character cut off at the end of the sample
+        sample = sample[:sample.rindex(b"\n") + 1]
+    for encoding in ("utf-8", "cp1252", "latin-1"):
+        try:
+            text = sample.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    try:
+        delimiter = csv.Sniffer().sniff(text, delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimiter = ","
+    return encoding, delimiter
+
+def _open_arrow_csv(file_path: str, encoding: str, delimiter: str, column_types=None):
+    from pyarrow import csv as pacsv
+
+    return pacsv.open_csv(
+        file_path,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=ARROW_CSV_BLOCK_BYTES, encoding=encoding),
+        parse_options=pacsv.ParseOptions(delimiter=delimiter),
+        convert_options=pacsv.ConvertOptions(
+            null_values=_CSV_NULL_VALUES, strings_can_be_null=True, column_types=column_types,
+        ),
+    )
+
+def iter_arrow_csv_chunks(file_path: str, chunk_rows: int = CSV_CHUNK_ROWS):
+    """Yield a CSV file as typed DataFrame chunks using Arrow's multithreaded CSV reader.
+
+    Encoding and delimiter are sniffed first. Arrow fixes column types from the
+    first block; if a later block does not fit them (an int column that turns
+    to text further down), the file is reopened with every column as text and
+    resumes after the rows already yielded, leaving conversion to the uploader.
+    """
+    import pyarrow as pa
+
+    encoding, delimiter = sniff_csv(file_path)
+    reader = _open_arrow_csv(file_path, encoding, delimiter)
+    yielded = 0
+    try:
+        for chunk in _rebatch(reader.schema, reader, chunk_rows):
+            yield chunk
+            yielded += len(chunk)
+        return
+    except pa.ArrowInvalid:
+        as_text = {name: pa.string() for name in reader.schema.names}
+    reader = _open_arrow_csv(file_path, encoding, delimiter, column_types=as_text)
+    yield from skip_rows(_rebatch(reader.schema, reader, chunk_rows), yielded)
+
+def skip_rows(frames, rows: int):
+    """Drop the first `rows` rows of a stream of DataFrame chunks."""
+    for frame in frames:
+        if rows >= len(frame):
+            rows -= len(frame)
+            continue
+        yield frame.iloc[rows:] if rows else frame
+        rows = 0
+
+def declared_column_specs(file_path: str):
+    """ColumnSpecs from the file's own schema for typed formats (Parquet/Arrow), else None."""
+    if not file_path.lower().endswith(ARROW_EXTENSIONS):
+        return None
+    from utils.type_inference import specs_from_arrow_schema
+
+    schema, _ = _arrow_source(file_path)
+    return specs_from_arrow_schema(schema)
+
+def iter_file_chunks(file_path: str, chunk_rows: int = CSV_CHUNK_ROWS):
+    """Return an iterator of DataFrame chunks for an uploaded CSV/XLS/XLSX file.
+
+    The file may also be gzip/bz2-compressed (data.csv.gz) or a .zip holding one
+    such file; it is then decompressed as a stream while it is parsed.
+    Parquet and Arrow IPC (.arrow/.feather/.ipc) files are read as record batches.
+    With CSV_PARSER = "arrow", plain .csv files go through iter_arrow_csv_chunks.
+    """
+    lower = file_path.lower()
+    if lower.endswith(".csv") and CSV_PARSER == "arrow":
+        return iter_arrow_csv_chunks(file_path, chunk_rows)
+    if lower.endswith(".csv"):
+        return iter(pd.read_csv(file_path, chunksize=chunk_rows))
+    if lower.endswith(".xlsx"):
+        return iter_xlsx_chunks(file_path, chunk_rows)
+    if lower.endswith(".xls"):
+        return iter([pd.read_excel(file_path)])
+    if lower.endswith(ARROW_EXTENSIONS):
+        return iter_arrow_chunks(file_path, chunk_rows)
+    if lower.endswith(".zip") or os.path.splitext(upload_extension(lower))[0] in DATA_EXTENSIONS:
+        return _iter_compressed_chunks(file_path, chunk_rows)
+    raise ValueError(
+        "Only CSV, XLS, XLSX (optionally .gz, .bz2 or .zip compressed), Parquet and Arrow files are supported."
+    )
+
+def _excel_header(values) -> list:
+    """Column names the way pd.read_excel builds them (Unnamed: i, a.1 for repeats)."""
+    names, seen = [], {}
+    for i, v in enumerate(values):
+        name = f"Unnamed: {i}" if v is None else str(v)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def _frame_from_rows(rows, columns) -> pd.DataFrame:
+    """Build a chunk and convert all-numeric text columns, matching read_excel's parser."""
+    df = pd.DataFrame(rows, columns=columns)
+    for c in df.columns:
+        if not pd.api.types.is_object_dtype(df[c]) and not pd.api.types.is_string_dtype(df[c]):
+            continue
+        try:
+            df[c] = pd.to_numeric(df[c])
+        except (ValueError, TypeError):
+            pass
+    return df
+
+def iter_xlsx_chunks(file_path, chunk_rows: int = CSV_CHUNK_ROWS, sheet=0):
+    """Yield one .xlsx sheet (path or file object) in chunks using openpyxl's read-only mode.
+
+    sheet is a sheet name or index; the first sheet by default.
+
+    Rows are pulled with values_only iteration straight off the sheet XML, so the
+    workbook object tree is never built and only one batch of rows is in memory.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[sheet]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _excel_header(header)
+        width = len(columns)
+        batch = []
+        # Like read_excel, keep blank rows between data rows but drop trailing ones;
+        # only their count is held until the next data row shows they are interior
+        blank = 0
+        for row in rows:
+            if all(v is None for v in row):
+                blank += 1
+                continue
+            if len(row) < width:
+                row = row + (None,) * (width - len(row))
+            for _ in range(blank):
+                batch.append((None,) * width)
+                if len(batch) >= chunk_rows:
+                    yield _frame_from_rows(batch, columns)
+                    batch = []
+            blank = 0
+            batch.append(row[:width])
+            if len(batch) >= chunk_rows:
+                yield _frame_from_rows(batch, columns)
+                batch = []
+        if batch:
+            yield _frame_from_rows(batch, columns)
+    finally:
+        wb.close()
+
+WORKBOOK_EXTENSIONS = (".xlsx", ".xls")
+
+def workbook_sheet_names(file_path: str) -> list:
+    """Sheet names of a plain .xlsx/.xls workbook, in workbook order."""
+    lower = file_path.lower()
+    if lower.endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        # Read-only mode only parses the workbook part here, not the sheets
+        wb = load_workbook(file_path, read_only=True)
+        try:
+            return list(wb.sheetnames)
+        finally:
+            wb.close()
+    if lower.endswith(".xls"):
+        with pd.ExcelFile(file_path) as xls:
+            return list(xls.sheet_names)
+    raise ValueError("Workbook uploads must be .xlsx or .xls files.")
+
+def iter_sheet_chunks(file_path: str, sheet: str, chunk_rows: int = CSV_CHUNK_ROWS):
+    """Return an iterator of DataFrame chunks for one sheet of an .xlsx/.xls workbook."""
+    if file_path.lower().endswith(".xlsx"):
+        return iter_xlsx_chunks(file_path, chunk_rows, sheet=sheet)
+    return iter([pd.read_excel(file_path, sheet_name=sheet)])
+
+def _spool_chunks(chunks) -> str:
+    fd, spool_path = tempfile.mkstemp(suffix=".chunks")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        os.remove(spool_path)
+        raise
+    return spool_path
+
+def spool_file_chunks(file_path: str, chunk_rows: int = CSV_CHUNK_ROWS) -> str:
+    """Parse file_path and pickle its chunks, one after another, into a temp file.
+
+    Runs in parse worker processes: the CPU-bound CSV/Excel parsing happens
+    there, and the loader only unpickles ready DataFrames. Returns the spool
+    path; the caller removes it.
+    """
+    return _spool_chunks(iter_file_chunks(file_path, chunk_rows))
+
+def spool_sheet_chunks(file_path: str, sheet: str, chunk_rows: int = CSV_CHUNK_ROWS) -> str:
+    """spool_file_chunks for one workbook sheet, so the sheets of a workbook parse in parallel."""
+    return _spool_chunks(iter_sheet_chunks(file_path, sheet, chunk_rows))
+
+def iter_spooled_chunks(spool_path: str):
+    """Yield the DataFrame chunks written by spool_file_chunks."""
+    with open(spool_path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
@@ -0,0 +1,73 @@
+import os
+import uuid
+import hashlib
+import threading
+from config.settings import RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES
+
+_evict_lock = threading.Lock()
+
+
+def result_key(*parts) -> str:
+    return hashlib.sha256("\0".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def _path(key: str) -> str:
+    return os.path.join(RESULT_CACHE_DIR, f"{key}.parquet")
+
+
+def get_rows(key: str):
+    """Cached result rows (list of dicts, in column order) for key, or None."""
+    import pyarrow.parquet as pq
+
+    path = _path(key)
+    try:
+        table = pq.read_table(path, memory_map=True)
+        os.utime(path)  # mark as recently used for LRU eviction
+    except FileNotFoundError:
+        return None
+    return table.to_pylist()
+
+
+def put_rows(key: str, rows) -> bool:
+    """Store result rows as Parquet; False when a value has no Arrow type (the result is then not cached)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if RESULT_CACHE_MAX_BYTES <= 0:
+        return False
+    try:
+        table = pa.Table.from_pylist(list(rows))
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return False
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    tmp = os.path.join(RESULT_CACHE_DIR, f".tmp-{uuid.uuid4().hex}")
+    try:
+        pq.write_table(table, tmp)
+        os.replace(tmp, _path(key))
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    evict()
+    return True
+
+
+def evict(max_bytes: int = RESULT_CACHE_MAX_BYTES):
+    """Remove least recently used results until the cache fits in max_bytes."""
+    with _evict_lock:
+        entries = []
+        for e in os.scandir(RESULT_CACHE_DIR):
+            if e.name.endswith(".parquet"):
+                try:
+                    st = e.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, e.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,120 @@
+"""
+Lexical relevance ranking of tables for a question (BM25 over table names,
+column names and any extra per-table text such as profiled values), used to
+send only the top-k table schemas to the model.
+"""
+import math
+import re
+import threading
+from collections import Counter
+
+_WORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+# Estimated prompt tokens of schema context: what was sent vs. what all tables would have cost
+_stats = {"questions": 0, "tables_total": 0, "tables_sent": 0, "tokens_full": 0, "tokens_sent": 0}
+_stats_lock = threading.Lock()
+
+
+def tokenize(text: str) -> list:
+    """Lowercase word tokens; snake_case and camelCase are split and a plural -s is dropped."""
+    tokens = []
+    for word in _WORD_RE.findall(str(text)):
+        word = word.lower()
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English and SQL
+    return (len(text) + 3) // 4
+
+
+class SchemaIndex:
+    """BM25 index with one document per table."""
+
+    def __init__(self, documents: dict, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.terms = {table: Counter(tokens) for table, tokens in documents.items()}
+        self.lengths = {table: sum(tf.values()) for table, tf in self.terms.items()}
+        self.avg_length = (sum(self.lengths.values()) / len(self.lengths)) if self.lengths else 0.0
+        df = Counter(term for tf in self.terms.values() for term in tf)
+        n = len(self.terms)
+        self.idf = {term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in df.items()}
+
+    def score(self, question: str) -> dict:
+        query = set(tokenize(question))
+        scores = {}
+        for table, tf in self.terms.items():
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[table] / (self.avg_length or 1))
+            s = 0.0
+            for term in query:
+                f = tf.get(term)
+                if f:
+                    s += self.idf[term] * f * (self.k1 + 1) / (f + norm)
+            scores[table] = s
+        return scores
+
+    def top_tables(self, question: str, k: int) -> list:
+        """Up to k tables with a positive score, best first; [] when nothing in the question matches."""
+        ranked = sorted(
+            ((s, t) for t, s in self.score(question).items() if s > 0),
+            key=lambda st: (-st[0], st[1]),
+        )
+        return [t for _, t in ranked[:k]]
+
+
+def build_schema_index(db, table_text: dict = None) -> SchemaIndex:
+    """Index a SQLDatabase's usable tables from its reflected metadata (no queries are run).
+
+    table_text optionally adds text per table, e.g. profiled column values.
+    """
+    tables = {t.name: t for t in db._metadata.sorted_tables}
+    documents = {}
+    for name in db.get_usable_table_names():
+        table = tables.get(name)
+        text = [name] + ([c.name for c in table.columns] if table is not None else [])
+        if table_text and name in table_text:
+            text.append(table_text[name])
+        documents[name] = tokenize(" ".join(text))
+    return SchemaIndex(documents)
+
+
+def table_ddl_tokens(db) -> dict:
+    """Estimated tokens of each usable table's CREATE TABLE text, compiled locally from metadata.
+
+    Tables with columns SQLAlchemy cannot render are left out.
+    """
+    from sqlalchemy.exc import CompileError
+    from sqlalchemy.schema import CreateTable
+
+    tables = {t.name: t for t in db._metadata.sorted_tables}
+    tokens = {}
+    for name in db.get_usable_table_names():
+        if name not in tables:
+            continue
+        try:
+            tokens[name] = estimate_tokens(str(CreateTable(tables[name]).compile(db._engine)))
+        except CompileError:
+            continue
+    return tokens
+
+
+def record_pruning(tables_total: int, tables_sent: int, tokens_full: int, tokens_sent: int):
+    with _stats_lock:
+        _stats["questions"] += 1
+        _stats["tables_total"] += tables_total
+        _stats["tables_sent"] += tables_sent
+        _stats["tokens_full"] += tokens_full
+        _stats["tokens_sent"] += tokens_sent
+
+
+def pruning_stats() -> dict:
+    """Cumulative schema pruning counters plus the fraction of schema tokens saved."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["tokens_saved"] = stats["tokens_full"] - stats["tokens_sent"]
+    stats["savings_ratio"] = (stats["tokens_saved"] / stats["tokens_full"]) if stats["tokens_full"] else 0.0
+    return stats
@@ -0,0 +1,328 @@
+import re
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+# pg_type: DDL type for the column.
+# parse: how raw values are converted before COPY: None (as-is), "number", "bool" or "datetime".
+# fmt: strptime format for "datetime" columns parsed from text.
+ColumnSpec = namedtuple("ColumnSpec", ["pg_type", "parse", "fmt"])
+
+_BOOL_VALUES = {"y": True, "yes": True, "true": True, "t": True, "n": False, "no": False, "false": False, "f": False}
+
+# Tried in order; month-first wins over day-first when both fit every value
+_DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S%z",
+    "%Y-%m-%d %H:%M",
+    "%Y/%m/%d",
+    "%m/%d/%Y",
+    "%d/%m/%Y",
+    "%m/%d/%Y %H:%M",
+    "%d/%m/%Y %H:%M",
+    "%m/%d/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M:%S",
+    "%d.%m.%Y",
+    "%d-%m-%Y",
+    "%d-%b-%Y",
+    "%d %b %Y",
+    "%b %d, %Y",
+]
+
+_NUMBER_RE = r"-?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|-?\.\d+"
+_CURRENCY_RE = r"[()$€£¥\s]"
+_SMALLINT_MAX = 32_767
+_INTEGER_MAX = 2_147_483_647
+# Beyond this, float64 can no longer represent 4 decimal places exactly
+_MAX_DECIMAL_MAGNITUDE = 1e11
+_MAX_DECIMAL_SCALE = 4
+
+
+def _int_type(lo, hi, complete: bool) -> str:
+    """Narrowest integer type for [lo, hi], one size up when only a sample was seen."""
+    order = ["smallint", "integer", "bigint"]
+    if -_SMALLINT_MAX - 1 <= lo and hi <= _SMALLINT_MAX:
+        idx = 0
+    elif -_INTEGER_MAX - 1 <= lo and hi <= _INTEGER_MAX:
+        idx = 1
+    else:
+        idx = 2
+    if not complete:
+        idx = min(idx + 1, 2)
+    return order[idx]
+
+
+def _numeric_type(values: np.ndarray, scale: int) -> str:
+    int_digits = len(str(int(np.abs(values).max()))) if len(values) else 1
+    return f"numeric({max(18, int_digits + scale)},{scale})"
+
+
+def _float_scale(values: np.ndarray):
+    """Smallest decimal scale (0..4) that represents every value, or None."""
+    if len(values) and np.abs(values).max() >= _MAX_DECIMAL_MAGNITUDE:
+        return None
+    for k in range(_MAX_DECIMAL_SCALE + 1):
+        scaled = values * 10 ** k
+        if np.allclose(scaled, np.round(scaled), rtol=0, atol=1e-6):
+            return k
+    return None
+
+
+def _number_type(values: np.ndarray, scale, complete: bool) -> str:
+    if scale == 0:
+        return _int_type(values.min(), values.max(), complete)
+    if scale is None or scale > _MAX_DECIMAL_SCALE or (
+        len(values) and np.abs(values).max() >= _MAX_DECIMAL_MAGNITUDE
+    ):
+        return "double precision"
+    if not complete:
+        # Later chunks may carry more decimals than the sample; leave room for them
+        scale = _MAX_DECIMAL_SCALE
+    return _numeric_type(values, scale)
+
+
+def _clean_number_text(t: pd.Series):
+    """Strip currency symbols, parentheses negatives and thousands separators.
+
+    Returns (cleaned text, negative mask, valid mask).
+    """
+    negative = t.str.match(r"^\(.*\)$") | t.str.endswith("-")
+    cleaned = t.str.replace(_CURRENCY_RE, "", regex=True).str.rstrip("-")
+    valid = cleaned.str.fullmatch(_NUMBER_RE).fillna(False).astype(bool)
+    return cleaned.str.replace(",", "", regex=False), negative, valid
+
+
+def parse_numbers(s: pd.Series) -> pd.Series:
+    """Vectorized number parsing for ERP text ("$1,234.50", "(12.00)", "7-"); failures are NaN."""
+    if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+        return s
+    t = s.astype("string").str.strip()
+    cleaned, negative, valid = _clean_number_text(t)
+    nums = pd.to_numeric(cleaned.where(valid), errors="coerce").astype("float64")
+    return nums.where(~negative.fillna(False).astype(bool), -nums)
+
+
+def parse_bools(s: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return s
+    return s.astype("string").str.strip().str.lower().map(_BOOL_VALUES).astype("boolean")
+
+
+def parse_datetimes(s: pd.Series, fmt: str = None) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return s
+    t = s.astype("string").str.strip()
+    if fmt is None:
+        return pd.to_datetime(t, errors="coerce", format="mixed")
+    return pd.to_datetime(t, errors="coerce", format=fmt)
+
+
+def _detect_date_format(t: pd.Series):
+    """First format in _DATE_FORMATS that parses every value, checked on a sample first."""
+    sample = t.iloc[:200]
+    for fmt in _DATE_FORMATS:
+        if pd.to_datetime(sample, errors="coerce", format=fmt).notna().all():
+            if pd.to_datetime(t, errors="coerce", format=fmt).notna().all():
+                return fmt
+    return None
+
+
+def _datetime_type(parsed: pd.Series, complete: bool = True, fmt: str = None) -> str:
+    """date when every value is midnight, unless only a sample was seen and values can carry a time."""
+    values = parsed.dropna()
+    if getattr(values.dtype, "tz", None) is not None or not (values == values.dt.normalize()).all():
+        return "timestamptz"
+    if not complete and (fmt is None or "%H" in fmt):
+        # Later chunks may have times of day, which a date column would drop
+        return "timestamptz"
+    return "date"
+
+
+def infer_column_spec(s: pd.Series, complete: bool = True) -> ColumnSpec:
+    """Pick the narrowest Postgres type for one column and how to convert it."""
+    values = s.dropna()
+    if pd.api.types.is_object_dtype(values.dtype) or pd.api.types.is_string_dtype(values.dtype):
+        values = values.astype("string").str.strip()
+        values = values[values != ""]
+    if values.empty:
+        return ColumnSpec("text", None, None)
+
+    dtype = values.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return ColumnSpec("boolean", "bool", None)
+    if pd.api.types.is_integer_dtype(dtype):
+        return ColumnSpec(_int_type(values.min(), values.max(), complete), "number", None)
+    if pd.api.types.is_float_dtype(dtype):
+        arr = values.to_numpy(dtype="float64")
+        scale = _float_scale(arr)
+        if scale == 0 and not complete:
+            # Whole values in a float column of a sample; later chunks may hold fractions
+            scale = _MAX_DECIMAL_SCALE
+        return ColumnSpec(_number_type(arr, scale, complete), "number", None)
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return ColumnSpec(_datetime_type(values, complete), "datetime", None)
+
+    # Text: try booleans, then numbers, then dates; anything else stays text
+    lowered = values.str.lower()
+    if lowered.isin(list(_BOOL_VALUES)).all():
+        return ColumnSpec("boolean", "bool", None)
+
+    cleaned, negative, valid = _clean_number_text(values)
+    if valid.all():
+        # Leading zeros mean codes (accounts, cost centers), not quantities
+        if not cleaned.str.match(r"^-?0\d").any():
+            frac = cleaned.str.extract(r"\.(\d+)$")[0].str.len()
+            scale = int(frac.max()) if frac.notna().any() else 0
+            if scale == 0 and not complete:
+                # Bare digit strings in a sample are as likely references (1001, later INV-1)
+                # as counts; currency-formatted ones are amounts that may gain decimals
+                if (cleaned == values).all():
+                    return ColumnSpec("text", None, None)
+                scale = _MAX_DECIMAL_SCALE
+            nums = pd.to_numeric(cleaned).astype("float64").to_numpy()
+            return ColumnSpec(_number_type(nums, scale, complete), "number", None)
+        return ColumnSpec("text", None, None)
+
+    fmt = _detect_date_format(values)
+    if fmt is not None:
+        return ColumnSpec(_datetime_type(parse_datetimes(values, fmt), complete, fmt), "datetime", fmt)
+    return ColumnSpec("text", None, None)
+
+
+def infer_column_types(df: pd.DataFrame, complete: bool = True) -> dict:
+    """Infer a ColumnSpec per column. Pass complete=False when df is only the first chunk."""
+    return {c: infer_column_spec(df[c], complete) for c in df.columns}
+
+
+def _arrow_pg_type(t) -> str:
+    import pyarrow.types as pat
+
+    if pat.is_boolean(t):
+        return "boolean"
+    if pat.is_int8(t) or pat.is_int16(t) or pat.is_uint8(t):
+        return "smallint"
+    if pat.is_int32(t) or pat.is_uint16(t):
+        return "integer"
+    if pat.is_int64(t) or pat.is_uint32(t):
+        return "bigint"
+    if pat.is_uint64(t):
+        return "numeric(20,0)"
+    if pat.is_float16(t) or pat.is_float32(t):
+        return "real"
+    if pat.is_float64(t):
+        return "double precision"
+    if pat.is_decimal(t):
+        return f"numeric({t.precision},{t.scale})"
+    if pat.is_date(t):
+        return "date"
+    if pat.is_timestamp(t):
+        return "timestamptz"
+    return "text"
+
+
+def specs_from_arrow_schema(schema) -> dict:
+    """ColumnSpec per field of a pyarrow Schema, typed from the schema instead of the values."""
+    specs = {}
+    for field in schema:
+        pg_type = _arrow_pg_type(field.type)
+        family = _family(pg_type)
+        specs[field.name] = ColumnSpec(pg_type, None if family == "text" else family, None)
+    return specs
+
+
+def _family(pg_type: str) -> str:
+    t = pg_type.lower()
+    if t in ("smallint", "integer", "bigint", "real", "double precision") or t.startswith("numeric"):
+        return "number"
+    if t in ("date", "timestamptz", "timestamp with time zone", "timestamp without time zone"):
+        return "datetime"
+    if t == "boolean":
+        return "bool"
+    return "text"
+
+
+def specs_for_table(specs: dict, table_types: dict) -> dict:
+    """Adapt inferred specs to an existing table's column types."""
+    out = {}
+    for c, pg_type in table_types.items():
+        spec = specs[c]
+        family = _family(pg_type)
+        if family == "text":
+            out[c] = ColumnSpec(pg_type, None, None)
+        elif family == _family(spec.pg_type):
+            out[c] = spec._replace(pg_type=pg_type)
+        else:
+            out[c] = ColumnSpec(pg_type, family, None)
+    return out
+
+
+def numeric_scale(pg_type: str):
+    """Scale of a numeric(p,s) type, or None for any other type (including bare numeric)."""
+    m = re.match(r"numeric\(\d+,\s*(\d+)\)", pg_type.lower())
+    return int(m.group(1)) if m else None
+
+
+def exact_numbers(s: pd.Series) -> bool:
+    """True for integer or Decimal values (e.g. Arrow uint64/decimal), which float64 could alter."""
+    if pd.api.types.is_integer_dtype(s.dtype):
+        return True
+    return pd.api.types.is_object_dtype(s.dtype) and pd.api.types.infer_dtype(s, skipna=True) == "decimal"
+
+
+def convert_column(s: pd.Series, spec: ColumnSpec) -> pd.Series:
+    """Convert raw values to the spec's type; values that cannot be converted become null."""
+    if spec.parse is None:
+        return s
+    if spec.parse == "bool":
+        return parse_bools(s)
+    if spec.parse == "datetime":
+        parsed = parse_datetimes(s, spec.fmt)
+        if spec.pg_type == "date":
+            parsed = parsed.dt.normalize()
+        return parsed
+    t = spec.pg_type.lower()
+    if numeric_scale(t) is not None and exact_numbers(s):
+        # Kept as is and loaded from their text; validation rejects values the column cannot hold
+        return s
+    nums = parse_numbers(s)
+    if t in ("smallint", "integer", "bigint"):
+        if pd.api.types.is_integer_dtype(nums.dtype):
+            # Already integers (e.g. Arrow int64); a float round trip would lose digits past 2**53
+            return nums.astype("Int64")
+        f = nums.astype("float64")
+        integral = f.isna() | (f == np.round(f))
+        return f.where(integral).astype("Int64")
+    scale = numeric_scale(t)
+    if scale is not None:
+        return nums.astype("float64").round(scale)
+    return nums
+
+
+def blank_mask(s: pd.Series) -> pd.Series:
+    """True where a value is missing or whitespace-only text."""
+    if pd.api.types.is_object_dtype(s.dtype) or pd.api.types.is_string_dtype(s.dtype):
+        return s.isna() | (s.astype("string").str.strip() == "")
+    return s.isna()
+
+
+def coerce_frame(df: pd.DataFrame, specs: dict) -> pd.DataFrame:
+    """Convert every column of df per specs before COPY.
+
+    Raises ValueError naming the first column with values that cannot be
+    converted to its inferred type.
+    """
+    out = df.copy()
+    for c, spec in specs.items():
+        converted = convert_column(df[c], spec)
+        failed = converted.isna() & ~blank_mask(df[c])
+        if failed.any():
+            example = df[c][failed].iloc[0]
+            raise ValueError(
+                f"Column '{c}': {int(failed.sum())} value(s) such as {example!r} cannot be converted to {spec.pg_type}."
+            )
+        out[c] = converted
+    return out
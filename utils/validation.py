@@ -0,0 +1,149 @@
+import re
+import decimal
+import tempfile
+import numpy as np
+import pandas as pd
+from utils.type_inference import blank_mask, convert_column, exact_numbers, parse_numbers, parse_datetimes
+
+# Rejection kinds, in the order a row's reason is picked when several apply
+REJECT_KINDS = ("null", "invalid", "out_of_range")
+
+# Column added to rejected rows; underscored so it cannot clash with ERP columns
+REASON_COLUMN = "_reject_reason"
+
+_INT_LIMITS = {"smallint": 2 ** 15, "integer": 2 ** 31, "bigint": 2 ** 63}
+
+# Enough digits for any numeric(p,s) value, so quantize never fails on a value that fits
+_EXACT_CONTEXT = decimal.Context(prec=1000)
+
+
+def _exact_out_of_range(s: pd.Series, precision: int, scale: int) -> pd.Series:
+    """The numeric(p,s) check done on integer or Decimal values without a float round trip."""
+    limit = decimal.Decimal(10) ** (precision - scale)
+    quantum = decimal.Decimal(1).scaleb(-scale)
+
+    def out(v):
+        if pd.isna(v):
+            return False
+        d = v if isinstance(v, decimal.Decimal) else decimal.Decimal(int(v))
+        if not d.is_finite() or abs(d) >= limit:
+            return True
+        return d != d.quantize(quantum, context=_EXACT_CONTEXT)
+
+    return s.map(out).astype(bool)
+
+
+def _out_of_range(s: pd.Series, pg_type: str) -> pd.Series:
+    """True where a number does not fit the column's integer or numeric(p,s) type.
+
+    For numeric(p,s) that includes values with more than s decimal places,
+    which the column would silently round.
+    """
+    t = pg_type.lower()
+    m = re.match(r"numeric\((\d+),\s*(\d+)\)", t)
+    if m and exact_numbers(s):
+        return _exact_out_of_range(s, int(m.group(1)), int(m.group(2)))
+    nums = parse_numbers(s).astype("float64")
+    if t in _INT_LIMITS:
+        limit = _INT_LIMITS[t]
+        return (nums < -limit) | (nums >= limit)
+    if m:
+        precision, scale = int(m.group(1)), int(m.group(2))
+        scaled = (nums * 10.0 ** scale).to_numpy()
+        # Relative tolerance covers float64 spacing at large magnitudes
+        extra_decimals = ~np.isclose(scaled, np.round(scaled), rtol=1e-15, atol=1e-6) & ~np.isnan(scaled)
+        return (nums.round(scale).abs() >= 10.0 ** (precision - scale)) | extra_decimals
+    if t in ("real", "double precision"):
+        return pd.Series(np.isinf(nums.to_numpy()), index=s.index)
+    return pd.Series(False, index=s.index)
+
+
+def _time_in_date(s: pd.Series, spec) -> pd.Series:
+    """True where a value headed for a date column has a time of day, which the column would drop."""
+    if spec.pg_type.lower() != "date":
+        return pd.Series(False, index=s.index)
+    parsed = parse_datetimes(s, spec.fmt)
+    return parsed.notna() & (parsed != parsed.dt.normalize())
+
+
+def validate_frame(df: pd.DataFrame, specs: dict):
+    """Convert df per specs and split off the rows that cannot be loaded.
+
+    Every check is a column-wise mask: blank values (null), values that do not
+    parse as the column's type or have a time of day bound for a date column
+    (invalid) and numbers that overflow the column or carry more decimals than
+    its scale (out_of_range). Returns (clean converted frame, rejected raw rows
+    with a REASON_COLUMN naming the first failing check and column,
+    {kind: count}).
+    """
+    reason = pd.Series(pd.NA, index=df.index, dtype="string")
+    kind = pd.Series(pd.NA, index=df.index, dtype="string")
+    out = df.copy()
+    checks = {k: [] for k in REJECT_KINDS}
+    for c, spec in specs.items():
+        raw = df[c]
+        blank = blank_mask(raw)
+        if spec.parse == "number":
+            oor = _out_of_range(raw, spec.pg_type) & ~blank
+        else:
+            oor = pd.Series(False, index=df.index)
+        converted = convert_column(raw.mask(oor), spec)
+        invalid = converted.isna() & ~blank & ~oor
+        if spec.parse == "datetime":
+            invalid |= _time_in_date(raw, spec) & ~blank
+        out[c] = converted
+        checks["null"].append((c, blank))
+        checks["invalid"].append((c, invalid))
+        checks["out_of_range"].append((c, oor))
+
+    for k in REJECT_KINDS:
+        for c, mask in checks[k]:
+            hit = kind.isna() & mask.to_numpy()
+            if hit.any():
+                reason = reason.mask(hit, f"{k}: {c}")
+                kind = kind.mask(hit, k)
+
+    rejected_mask = kind.notna().to_numpy()
+    counts = {k: int((kind == k).sum()) for k in REJECT_KINDS}
+    rejected = df[rejected_mask].assign(**{REASON_COLUMN: reason[rejected_mask]})
+    return out[~rejected_mask], rejected, counts
+
+
+class QuarantineSpool:
+    """Collects rejected rows on disk for one bulk COPY into the quarantine table.
+
+    Rows are kept as (table, file hash, reason, row as JSON) CSV records in a
+    spooled temp file, so a file with many bad rows does not grow memory
+    during the upload.
+    """
+
+    def __init__(self, table_name: str, file_hash: str, max_memory: int = 4 * 1024 * 1024):
+        self.table_name = table_name
+        self.file_hash = file_hash
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_memory, mode="w+", newline="")
+        self.rows = 0
+        self.counts = {k: 0 for k in REJECT_KINDS}
+
+    def add(self, rejected: pd.DataFrame, counts: dict):
+        for k, n in counts.items():
+            self.counts[k] += n
+        if rejected.empty:
+            return
+        data = rejected.drop(columns=REASON_COLUMN)
+        data.columns = [str(c) for c in data.columns]
+        payload = data.to_json(orient="records", lines=True, date_format="iso", default_handler=str)
+        records = pd.DataFrame({
+            "table_name": self.table_name,
+            "file_hash": self.file_hash,
+            "reason": rejected[REASON_COLUMN].to_numpy(),
+            "row_data": payload.rstrip("\n").split("\n"),
+        })
+        records.to_csv(self.file, index=False, header=False)
+        self.rows += len(rejected)
+
+    def reader(self):
+        self.file.seek(0)
+        return self.file
+
+    def close(self):
+        self.file.close()